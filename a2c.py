@@ -1,10 +1,13 @@
-import random
 import numpy as np
 import tensorflow as tf
 
+from instrumentation import NULL_INSTRUMENTATION
+from reward_stats import RunningStats
+from rollout import sample_actions
+
 class ActorCritic:
     
-    def __init__(self, input_shape, num_actions, discount=0.99):
+    def __init__(self, input_shape, num_actions, discount=0.99, seed=None):
         
         initializer = tf.keras.initializers.GlorotUniform()
         self.actor = tf.keras.models.Sequential([
@@ -25,72 +28,201 @@ class ActorCritic:
         self.epsilon_decay = 0.9975
         self.current_reward = 0
 
+        # Action sampling has its own generator instead of the global np.random state
+        self.rng = np.random.default_rng(seed)
+
+        # Returns of all finished segmented episodes, segmented episodes normalize with
+        # them and the critic predicts returns in their units
+        self.return_stats = RunningStats()
+
+        # Observations and running episode rewards carried between train_rollout calls
+        self.rollout_state = None
+        self.rollout_rewards = None
+
+        # instrumentation.Instrumentation timing inference and training, one row per train_episode
+        self.instrumentation = NULL_INSTRUMENTATION
+
+    @tf.function(input_signature=[tf.TensorSpec(shape=[None, None], dtype=tf.float32)])
+    def predict(self, states):
+
+        # [N, observation] -> policy [N, num_actions], value [N] in one compiled call
+        policy_dist = self.actor(states)
+        values = tf.squeeze(self.critic(states), axis=1)
+
+        return policy_dist, values
+
+
     def forward(self, state):
-        state = tf.convert_to_tensor(state)
-        state = tf.expand_dims(state, 0)
-        policy_dist = self.actor(state)
-        value = self.critic(state)
+        state = np.asarray(state, dtype=np.float32)[None]
+        policy_dist, value = self.predict(state)
 
         return tf.squeeze(policy_dist), tf.squeeze(value)
 
 
-    def train_episode(self, env, max_steps):
+    def act(self, states):
 
-        state = env.reset()
-        rewards = []
-        values = []
-        log_probs = []
+        # Epsilon-greedy sampling for a batch of observations, e.g. from a VectorFlappyEnv
+        policy_dist, values = self.predict(np.asarray(states, dtype=np.float32))
+        actions = sample_actions(policy_dist.numpy(), self.epsilon, self.num_actions, self.rng)
 
-        with tf.GradientTape(persistent=True) as tape:
+        return actions, values.numpy()
 
-            for step in range(max_steps):
 
-                policy_dist, value = self.forward(state)
-                if np.random.random() > self.epsilon:
-                    action = np.random.choice(self.num_actions, p=policy_dist.numpy())
-                else:
-                    action = env.sample_action()                
+    @tf.function(input_signature=[tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+                                  tf.TensorSpec(shape=[None], dtype=tf.int32),
+                                  tf.TensorSpec(shape=[None], dtype=tf.float32)])
+    def train_step(self, states, actions, returns):
 
-                state, reward, done = env.step(action)
+        with tf.GradientTape() as tape:
 
-                log_prob = tf.math.log(policy_dist[action] + 1e-5)
+            policy_dist = self.actor(states)
+            values = tf.squeeze(self.critic(states), axis=1)
 
-                rewards.append(reward)
-                values.append(value)
-                log_probs.append(log_prob)
+            log_probs = tf.math.log(tf.gather(policy_dist, actions, batch_dims=1) + 1e-5)
+            advantages = returns - values
 
-                if done:
-                    Qval = 0
-                    break
-                elif step == max_steps - 1:
-                    _, Qval = self.forward(state)
-                    Qval = Qval
-                    break
-            
-            Qvals = np.zeros_like(values)
-            for t in reversed(range(len(values))):
-                Qval = rewards[t] + self.discount * Qval
-                Qvals[t] = Qval 
-            
-            Qvals = (Qvals - np.mean(Qvals)) / (np.std(Qvals) + np.finfo(np.float32).eps.item()) # np.finfo(np.float32).eps.item() is small epsilon value
-            
-            advantages = []
-            for Qval, value in zip(Qvals, values):
-                advantages.append(Qval - value)
-
-            actor_loss = 0
-            for log_prob, advantage in zip(log_probs, advantages):
-                actor_loss -= (log_prob * advantage) / len(log_probs)
-                     
+            actor_loss = -tf.math.reduce_mean(log_probs * advantages)
             critic_loss = 0.5 * tf.math.reduce_mean(tf.math.pow(advantages, 2))
 
             ac_loss = actor_loss + critic_loss
-        
+
         actor_grads, critic_grads = tape.gradient(ac_loss, [self.actor.trainable_variables, self.critic.trainable_variables])
 
         self.actor_optimizer.apply_gradients(zip(actor_grads, self.actor.trainable_variables))
         self.critic_optimizer.apply_gradients(zip(critic_grads, self.critic.trainable_variables))
 
+        return actor_loss, critic_loss
+
+
+    def train_episode(self, env, max_steps, segment_length=None):
+
+        # With segment_length, the episode is trained every segment_length steps with the
+        # value of the state it was cut at, so only its rewards are kept for the whole
+        # episode. Returns are then normalized with return_stats instead of per segment,
+        # short segments like a lone crash step keep their reward scale.
+        running = segment_length is not None
+        instrumentation = self.instrumentation
+        state = env.reset()
+        states = []
+        actions = []
+        rewards = []
+        episode_rewards = []
+        episode_reward = 0
+        episode_steps = 0
+
+        # Acting runs outside of any tape, the loss is recomputed in one batched train_step
+        for step in range(max_steps):
+
+            with instrumentation.phase('inference'):
+                action, _ = self.act([state])
+                action = int(action[0])
+
+            states.append(state)
+            actions.append(action)
+
+            state, reward, done = env.step(action)
+
+            rewards.append(reward)
+            if running:
+                episode_rewards.append(reward)
+
+            if done:
+                Qval = 0
+            elif step == max_steps - 1 or len(rewards) == segment_length:
+                with instrumentation.phase('inference'):
+                    _, Qval = self.forward(state)
+                    Qval = Qval.numpy()
+                if running:
+                    Qval = Qval * self.return_scale() + self.return_stats.mean
+            else:
+                continue
+
+            actor_loss, critic_loss = self.train_segment(states, actions, rewards, Qval, running)
+            episode_reward += sum(rewards)
+            episode_steps += len(rewards)
+            states, actions, rewards = [], [], []
+
+            if done:
+                break
+
+        # return_stats only learns from the Monte Carlo returns of finished episodes, never
+        # from bootstrapped targets, which would feed the statistics their own output
+        if running and done:
+            Qval = 0.
+            for reward in reversed(episode_rewards):
+                Qval = reward + self.discount * Qval
+                self.return_stats.update(Qval)
+
         self.epsilon *= self.epsilon_decay
 
-        self.current_reward = sum(rewards)
\ No newline at end of file
+        self.current_reward = episode_reward
+
+        if instrumentation.enabled:
+            instrumentation.end_episode(reward=self.current_reward, steps=episode_steps, epsilon=self.epsilon,
+                                        actor_loss=float(actor_loss), critic_loss=float(critic_loss))
+
+
+    def return_scale(self):
+
+        # Std of the returns of finished episodes, at least 1. Returns are only ever scaled
+        # down, so a first short episode of near-identical returns cannot blow up later ones.
+        return max(self.return_stats.std, 1.)
+
+
+    def train_segment(self, states, actions, rewards, Qval, running=False):
+
+        # Discounted returns from Qval, the value after the last step, then one train_step.
+        # With running, returns are normalized with return_stats, otherwise with their own
+        # mean and std.
+        Qvals = np.zeros(len(rewards), dtype=np.float32)
+        for t in reversed(range(len(rewards))):
+            Qval = rewards[t] + self.discount * Qval
+            Qvals[t] = Qval
+
+        if running:
+            Qvals = ((Qvals - self.return_stats.mean) / self.return_scale()).astype(np.float32)
+        else:
+            Qvals = (Qvals - np.mean(Qvals)) / (np.std(Qvals) + np.finfo(np.float32).eps.item()) # np.finfo(np.float32).eps.item() is small epsilon value
+
+        # Gradients and both optimizer updates run in one compiled call, timed together
+        with self.instrumentation.phase('gradient'):
+            return self.train_step(np.asarray(states, dtype=np.float32), np.asarray(actions, dtype=np.int32), Qvals)
+
+
+    def train_rollout(self, env, buffer, gae_lambda=0.95):
+
+        # One fixed-length rollout on a VectorFlappyEnv followed by one train_step.
+        # Returns the rewards of the episodes that finished during the rollout.
+        if self.rollout_state is None:
+            self.rollout_state = env.reset()
+            self.rollout_rewards = np.zeros(env.num_envs)
+
+        buffer.reset()
+        state = self.rollout_state
+        finished_rewards = []
+
+        for step in range(buffer.n_steps):
+
+            actions, values = self.act(state)
+            next_state, rewards, dones = env.step(actions)
+
+            buffer.add(state, actions, rewards, dones, values)
+
+            self.rollout_rewards += rewards
+            finished_rewards.extend(self.rollout_rewards[dones])
+            self.rollout_rewards[dones] = 0
+            state = next_state
+
+        self.rollout_state = state
+
+        _, last_values = self.predict(np.asarray(state, dtype=np.float32))
+        buffer.compute_returns(last_values.numpy(), self.discount, gae_lambda)
+
+        self.train_step(*buffer.get())
+
+        self.epsilon *= self.epsilon_decay ** len(finished_rewards)
+
+        if finished_rewards:
+            self.current_reward = finished_rewards[-1]
+
+        return finished_rewards
@@ -0,0 +1,199 @@
+import multiprocessing
+import queue
+import numpy as np
+
+from numpy_policy import NumpyPolicy
+from rollout import RolloutBuffer
+from vector_env import VectorFlappyEnv
+
+# Workers never import TensorFlow: they run the actor and the critic as NumpyPolicy
+# copies of their weights, which keeps them small and quick to spawn.
+
+
+def unflatten(flat, shapes):
+
+    weights = []
+    offset = 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        weights.append(flat[offset:offset + size].reshape(shape).copy())
+        offset += size
+
+    return weights
+
+
+class SharedWeights:
+
+    # Actor and critic weights in one shared float32 block, plus epsilon and a version
+    # counter that workers check before every rollout
+
+    def __init__(self, context, actor_weights, critic_weights):
+
+        self.actor_shapes = [w.shape for w in actor_weights]
+        self.critic_shapes = [w.shape for w in critic_weights]
+        self.actor_size = sum(w.size for w in actor_weights)
+        size = self.actor_size + sum(w.size for w in critic_weights)
+
+        self.lock = context.Lock()
+        self.buffer = context.RawArray('f', size)
+        self.epsilon = context.RawValue('d', 1.0)
+        self.version = context.RawValue('l', 0)
+
+
+    def write(self, actor_weights, critic_weights, epsilon):
+
+        flat = np.frombuffer(self.buffer, dtype=np.float32)
+        with self.lock:
+            flat[:] = np.concatenate([w.ravel() for w in actor_weights + critic_weights])
+            self.epsilon.value = epsilon
+            self.version.value += 1
+
+
+    def read(self):
+
+        flat = np.frombuffer(self.buffer, dtype=np.float32)
+        with self.lock:
+            actor_weights = unflatten(flat[:self.actor_size], self.actor_shapes)
+            critic_weights = unflatten(flat[self.actor_size:], self.critic_shapes)
+
+            return actor_weights, critic_weights, self.epsilon.value, self.version.value
+
+
+def rollout_worker(worker_id, shared_weights, stop_event, result_queue, num_envs, n_steps, discount, gae_lambda, seed):
+
+    # Worker streams are independent children of seed
+    env_seed, action_seed = np.random.SeedSequence(seed, spawn_key=(worker_id,)).spawn(2)
+    rng = np.random.default_rng(action_seed)
+
+    env = VectorFlappyEnv(num_envs, seed=env_seed)
+    buffer = RolloutBuffer(n_steps, num_envs, env.observation_shape)
+    state = env.reset()
+    episode_rewards = np.zeros(num_envs)
+    version = -1
+
+    while not stop_event.is_set():
+
+        # Always act with the newest weights the learner has published
+        if shared_weights.version.value != version:
+            actor_weights, critic_weights, epsilon, version = shared_weights.read()
+            # Actions keep coming from the worker stream
+            actor = NumpyPolicy.from_weights(actor_weights, 'softmax', seed=rng)
+            critic = NumpyPolicy.from_weights(critic_weights, 'linear')
+
+        buffer.reset()
+        finished_rewards = []
+
+        for step in range(n_steps):
+
+            actions = actor.act(state, greedy=False, epsilon=epsilon)
+            values = critic.forward(state)[:, 0]
+
+            next_state, rewards, dones = env.step(actions)
+            buffer.add(state, actions, rewards, dones, values)
+
+            episode_rewards += rewards
+            finished_rewards.extend(episode_rewards[dones])
+            episode_rewards[dones] = 0
+            state = next_state
+
+        last_values = critic.forward(state)[:, 0]
+        buffer.compute_returns(last_values, discount, gae_lambda)
+
+        # The queue pickles in a feeder thread after put returns, by then the buffer may
+        # hold the next rollout, so it gets copies
+        rollout = tuple(np.array(x) for x in buffer.get()) + (finished_rewards,)
+        while not stop_event.is_set():
+            try:
+                result_queue.put(rollout, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+
+class ParallelTrainer:
+
+    # A2C with num_workers rollout processes, each owning a VectorFlappyEnv of envs_per_worker
+    # worlds. The learner trains actor_critic on the rollouts of all workers at once and
+    # publishes the new weights every sync_every updates; in between workers keep collecting
+    # with the weights they have, so simulation and training overlap.
+
+    def __init__(self, actor_critic, num_workers=4, envs_per_worker=16, n_steps=32, gae_lambda=0.95, sync_every=1, seed=None):
+
+        self.actor_critic = actor_critic
+        self.num_workers = num_workers
+        self.sync_every = sync_every
+        self.updates = 0
+
+        # TensorFlow does not survive fork, workers are always spawned
+        context = multiprocessing.get_context('spawn')
+        self.shared_weights = SharedWeights(context, actor_critic.actor.get_weights(), actor_critic.critic.get_weights())
+        self.stop_event = context.Event()
+        self.result_queue = context.Queue(maxsize=2 * num_workers)
+        self.broadcast()
+
+        self.workers = []
+        for worker_id in range(num_workers):
+            worker = context.Process(target=rollout_worker,
+                                     args=(worker_id, self.shared_weights, self.stop_event, self.result_queue,
+                                           envs_per_worker, n_steps, actor_critic.discount, gae_lambda, seed),
+                                     daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+
+    def broadcast(self):
+        self.shared_weights.write(self.actor_critic.actor.get_weights(), self.actor_critic.critic.get_weights(), self.actor_critic.epsilon)
+
+
+    def train(self, num_updates):
+
+        # Returns the rewards of all episodes finished by the workers
+        total_rewards = []
+
+        for update in range(num_updates):
+
+            rollouts = [self.get_rollout() for _ in range(self.num_workers)]
+            states, actions, returns, _ = zip(*rollouts)
+
+            self.actor_critic.train_step(np.concatenate(states), np.concatenate(actions), np.concatenate(returns))
+
+            for rollout in rollouts:
+                total_rewards.extend(rollout[3])
+                self.actor_critic.epsilon *= self.actor_critic.epsilon_decay ** len(rollout[3])
+
+            if total_rewards:
+                self.actor_critic.current_reward = total_rewards[-1]
+
+            self.updates += 1
+            if self.updates % self.sync_every == 0:
+                self.broadcast()
+
+        return total_rewards
+
+
+    def get_rollout(self, timeout=0.5):
+
+        # Next rollout of any worker, raises instead of waiting forever once a worker died
+        while True:
+            for worker_id, worker in enumerate(self.workers):
+                if not worker.is_alive():
+                    raise RuntimeError(f"Rollout worker {worker_id} exited with code {worker.exitcode}")
+            try:
+                return self.result_queue.get(timeout=timeout)
+            except queue.Empty:
+                pass
+
+
+    def close(self):
+
+        self.stop_event.set()
+
+        # Drain rollouts still in flight so the queue feeder threads can exit
+        while any(worker.is_alive() for worker in self.workers):
+            try:
+                self.result_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+        for worker in self.workers:
+            worker.join()
@@ -0,0 +1,230 @@
+import argparse
+import json
+import platform
+import random
+import resource
+import sys
+import time
+import numpy as np
+
+from flappy_env import FlappyBirdEnv
+from observations import OBSERVATIONS
+from vector_env import VectorFlappyEnv
+
+# Throughput benchmarks of every training entry point, all headless and seeded.
+# TensorFlow and neat are only imported by the suites that need them.
+#
+#   python benchmark.py --suites env,modes,vector,inference,train,neat --output bench.json
+
+
+def peak_rss_mb():
+
+    # ru_maxrss is in kilobytes on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    return round(max(own, children) / 1024, 1)
+
+
+def latency_stats(samples):
+
+    samples = np.asarray(samples) * 1e6
+    return {'p50_us': round(float(np.percentile(samples, 50)), 1), 'p99_us': round(float(np.percentile(samples, 99)), 1)}
+
+
+def bench_env(steps, seed, **env_kwargs):
+
+    env = FlappyBirdEnv(seed=seed, **env_kwargs)
+    env.reset()
+    episodes = 0
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        _, _, done = env.step(env.sample_action())
+        if done:
+            env.reset()
+            episodes += 1
+    elapsed = time.perf_counter() - start
+
+    return {'steps_per_s': steps / elapsed,
+            'frames_per_s': steps * (1 + env.step_size) / elapsed,
+            'episodes_per_s': episodes / elapsed}
+
+
+def bench_env_modes(steps, step_sizes, seed):
+
+    # Every observation mode against decision frequency
+    return [dict(observation=observation, step_size=step_size,
+                 **bench_env(steps, seed, observation=observation, step_size=step_size))
+            for observation in OBSERVATIONS for step_size in step_sizes]
+
+
+def bench_vector_env(num_envs, steps, seed):
+
+    env = VectorFlappyEnv(num_envs, seed=seed)
+    env.reset()
+    episodes = 0
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        _, _, done = env.step(env.sample_action())
+        episodes += int(done.sum())
+    elapsed = time.perf_counter() - start
+
+    return {'num_envs': num_envs,
+            'steps_per_s': steps * num_envs / elapsed,
+            'frames_per_s': steps * num_envs * (1 + env.step_size) / elapsed,
+            'episodes_per_s': episodes / elapsed}
+
+
+def bench_inference(batch_sizes, repeats, seed):
+
+    from a2c import ActorCritic
+    from numpy_policy import NumpyPolicy
+
+    actor_critic = ActorCritic([2], 2, seed=seed)
+    policy = NumpyPolicy.from_model(actor_critic.actor, seed=seed)
+    engines = {'tensorflow': actor_critic.act,
+               'numpy': lambda states: policy.act(states, greedy=False, epsilon=actor_critic.epsilon)}
+    rng = np.random.default_rng(seed)
+    results = []
+
+    for engine, act in engines.items():
+        for batch_size in batch_sizes:
+            states = rng.normal(size=(batch_size, 2)).astype(np.float32)
+            act(states)
+
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                act(states)
+                samples.append(time.perf_counter() - start)
+
+            results.append(dict(engine=engine, batch_size=batch_size, observations_per_s=batch_size / np.mean(samples), **latency_stats(samples)))
+
+    return results
+
+
+def bench_training(num_envs, n_steps, updates, episodes, seed):
+
+    from a2c import ActorCritic
+    from rollout import RolloutBuffer
+
+    results = {}
+
+    actor_critic = ActorCritic([2], 2, seed=seed)
+    env = FlappyBirdEnv(seed=seed)
+    actor_critic.train_episode(env, 10000)
+
+    start = time.perf_counter()
+    for _ in range(episodes):
+        actor_critic.train_episode(env, 10000)
+    elapsed = time.perf_counter() - start
+    results['train_episode'] = {'updates_per_s': episodes / elapsed}
+
+    actor_critic = ActorCritic([2], 2, seed=seed)
+    env = VectorFlappyEnv(num_envs, seed=seed)
+    buffer = RolloutBuffer(n_steps, num_envs, env.observation_shape)
+    actor_critic.train_rollout(env, buffer)
+
+    start = time.perf_counter()
+    for _ in range(updates):
+        actor_critic.train_rollout(env, buffer)
+    elapsed = time.perf_counter() - start
+    results['train_rollout'] = {'num_envs': num_envs, 'n_steps': n_steps,
+                                'updates_per_s': updates / elapsed,
+                                'steps_per_s': updates * n_steps * num_envs / elapsed}
+
+    return results
+
+
+def bench_neat(pop_sizes, generations, num_workers, max_frames, seed):
+
+    import neat
+    from flappy_neat import HeadlessEvaluator
+
+    results = []
+
+    for pop_size in pop_sizes:
+        config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                                    neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                                    'config_file.txt')
+        config.pop_size = pop_size
+        # Keep evolving for the requested number of generations
+        config.fitness_threshold = float('inf')
+
+        # neat draws genomes from the global random state
+        random.seed(seed)
+        neat_pop = neat.population.Population(config)
+        evaluator = HeadlessEvaluator(num_workers, seed, max_frames=max_frames)
+        try:
+            start = time.perf_counter()
+            neat_pop.run(evaluator.evaluate, generations)
+            elapsed = time.perf_counter() - start
+        finally:
+            evaluator.close()
+
+        results.append({'pop_size': pop_size, 'num_workers': num_workers, 'max_frames': max_frames,
+                        'generations_per_min': 60 * generations / elapsed})
+
+    return results
+
+
+def parse_ints(text):
+    return [int(value) for value in text.split(',')]
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Flappy Bird throughput benchmarks')
+    parser.add_argument('--suites', default='env,modes,vector,inference,train,neat')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--steps', type=int, default=20000, help='env steps of the single env suite')
+    parser.add_argument('--step-sizes', type=parse_ints, default=[0, 4, 9], help='no-op frames per action of the modes suite')
+    parser.add_argument('--vector-steps', type=int, default=500, help='batched steps per vector env size')
+    parser.add_argument('--num-envs', type=parse_ints, default=[1, 16, 256, 4096])
+    parser.add_argument('--batch-sizes', type=parse_ints, default=[1, 64, 1024])
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--episodes', type=int, default=20, help='train_episode calls of the train suite')
+    parser.add_argument('--updates', type=int, default=50, help='train_rollout calls of the train suite')
+    parser.add_argument('--pop-sizes', type=parse_ints, default=[10, 100, 500])
+    parser.add_argument('--generations', type=int, default=3)
+    parser.add_argument('--num-workers', type=int, default=1)
+    parser.add_argument('--max-frames', type=int, default=3000)
+    parser.add_argument('--output', default=None, help='JSON file, printed to stdout when omitted')
+    args = parser.parse_args(argv)
+
+    suites = args.suites.split(',')
+    report = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': sys.version.split()[0],
+              'platform': platform.platform(),
+              'numpy': np.__version__,
+              'seed': args.seed}
+
+    if 'env' in suites:
+        report['env'] = bench_env(args.steps, args.seed)
+    if 'modes' in suites:
+        report['modes'] = bench_env_modes(args.steps, args.step_sizes, args.seed)
+    if 'vector' in suites:
+        report['vector'] = [bench_vector_env(num_envs, args.vector_steps, args.seed) for num_envs in args.num_envs]
+    if 'inference' in suites:
+        report['inference'] = bench_inference(args.batch_sizes, args.repeats, args.seed)
+    if 'train' in suites:
+        report['train'] = bench_training(args.num_envs[-1], 32, args.updates, args.episodes, args.seed)
+    if 'neat' in suites:
+        report['neat'] = bench_neat(args.pop_sizes, args.generations, args.num_workers, args.max_frames, args.seed)
+
+    report['peak_rss_mb'] = peak_rss_mb()
+
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+    return report
+
+
+if __name__ == '__main__':
+    main()
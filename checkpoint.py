@@ -0,0 +1,186 @@
+import os
+import pickle
+import random
+import re
+import tempfile
+import numpy as np
+
+from reward_stats import RewardHistory
+
+# Checkpoints of A2C runs: weights of both networks, both Adam states, epsilon, the
+# counters and every random generator involved, so a resumed run continues exactly
+# where the saved one stopped. Everything is a NumPy array or a plain Python object
+# in one pickle, which saves and loads far faster than two h5 models.
+#
+#   checkpointer = Checkpointer('checkpoints', every=50)
+#   history = RewardHistory(JSONLWriter('rewards.jsonl'))
+#   episode, saved_history = checkpointer.restore(actor_critic, env)
+#   history.setstate(saved_history)
+#   for episode in range(episode, 1800):
+#       actor_critic.train_episode(env, 10000, segment_length=500)
+#       history.update(actor_critic.current_reward)
+#       checkpointer.maybe_save(episode + 1, actor_critic, env, history)
+#
+# total_rewards is a reward_stats.RewardHistory, whose state is saved, or a plain list.
+
+def current_umask():
+
+    # The umask can only be read by setting it
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def atomic_write(path, write, mode='wb'):
+
+    # write(f) fills a temporary file next to path which then replaces path in one
+    # rename, a crash mid-save leaves the previous checkpoint intact
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates 0600, the file gets the permissions open() would have given
+        os.chmod(temp_path, 0o666 & ~current_umask())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def optimizer_variables(optimizer):
+
+    # A method on tf.keras 2 optimizers, a property on Keras 3
+    variables = optimizer.variables
+    return variables() if callable(variables) else variables
+
+
+def restore_optimizer(optimizer, model, values):
+
+    import tensorflow as tf
+
+    variables = optimizer_variables(optimizer)
+    if len(variables) != len(values):
+        # Adam creates its slots on the first update, a zero update creates them and
+        # everything it changed is overwritten below
+        trainable = model.trainable_variables
+        optimizer.apply_gradients(zip([tf.zeros_like(v) for v in trainable], trainable))
+        variables = optimizer_variables(optimizer)
+
+    if len(variables) != len(values):
+        raise ValueError(f"Got {len(values)} optimizer variables, expected {len(variables)}")
+
+    for variable, value in zip(variables, values):
+        variable.assign(value)
+
+
+def save_checkpoint(path, actor_critic, episode=0, env=None, total_rewards=None):
+
+    state = {
+        'episode': episode,
+        'total_rewards': total_rewards.getstate() if isinstance(total_rewards, RewardHistory) else list(total_rewards or []),
+        'actor': actor_critic.actor.get_weights(),
+        'critic': actor_critic.critic.get_weights(),
+        'actor_optimizer': [np.array(v) for v in optimizer_variables(actor_critic.actor_optimizer)],
+        'critic_optimizer': [np.array(v) for v in optimizer_variables(actor_critic.critic_optimizer)],
+        'epsilon': actor_critic.epsilon,
+        'current_reward': actor_critic.current_reward,
+        'rng': actor_critic.rng.bit_generator.state,
+        'return_stats': vars(actor_critic.return_stats).copy(),
+        'rollout_state': actor_critic.rollout_state,
+        'rollout_rewards': actor_critic.rollout_rewards,
+        'python_random': random.getstate(),
+        'numpy_random': np.random.get_state(),
+        'env': None if env is None else env.getstate(),
+    }
+
+    atomic_write(path, lambda f: pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def load_checkpoint(path, actor_critic, env=None):
+
+    # Restores actor_critic (and env) in place, returns (episode, total_rewards)
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+
+    actor_critic.actor.set_weights(state['actor'])
+    actor_critic.critic.set_weights(state['critic'])
+    restore_optimizer(actor_critic.actor_optimizer, actor_critic.actor, state['actor_optimizer'])
+    restore_optimizer(actor_critic.critic_optimizer, actor_critic.critic, state['critic_optimizer'])
+
+    actor_critic.epsilon = state['epsilon']
+    actor_critic.current_reward = state['current_reward']
+    actor_critic.rng.bit_generator.state = state['rng']
+    # Checkpoints before segmented training have no return statistics
+    vars(actor_critic.return_stats).update(state.get('return_stats', {}))
+    actor_critic.rollout_state = state['rollout_state']
+    actor_critic.rollout_rewards = state['rollout_rewards']
+
+    random.setstate(state['python_random'])
+    np.random.set_state(state['numpy_random'])
+    if env is not None and state['env'] is not None:
+        env.setstate(state['env'])
+
+    return state['episode'], state['total_rewards']
+
+
+class Checkpointer:
+
+    # Saves a checkpoint every `every` episodes (or updates) into directory and keeps
+    # the newest `keep` of them. restore picks up the newest one in a single call.
+
+    def __init__(self, directory='checkpoints', every=50, keep=3, prefix='a2c-checkpoint-'):
+
+        self.directory = directory
+        self.every = every
+        self.keep = keep
+        self.prefix = prefix
+        self.pattern = re.compile(re.escape(prefix) + r'(\d+)\.pkl$')
+
+
+    def path(self, episode):
+        return os.path.join(self.directory, f'{self.prefix}{episode}.pkl')
+
+
+    def checkpoints(self):
+
+        # (episode, path) of every checkpoint in directory, oldest first
+        if not os.path.isdir(self.directory):
+            return []
+
+        found = []
+        for filename in os.listdir(self.directory):
+            match = self.pattern.match(filename)
+            if match:
+                found.append((int(match.group(1)), os.path.join(self.directory, filename)))
+
+        return sorted(found)
+
+
+    def save(self, episode, actor_critic, env=None, total_rewards=None):
+
+        save_checkpoint(self.path(episode), actor_critic, episode, env, total_rewards)
+
+        if self.keep is not None:
+            for _, path in self.checkpoints()[:-self.keep]:
+                os.remove(path)
+
+
+    def maybe_save(self, episode, actor_critic, env=None, total_rewards=None):
+
+        if episode % self.every == 0:
+            self.save(episode, actor_critic, env, total_rewards)
+
+
+    def restore(self, actor_critic, env=None):
+
+        # (0, []) when there is nothing to resume from
+        checkpoints = self.checkpoints()
+        if not checkpoints:
+            return 0, []
+
+        return load_checkpoint(checkpoints[-1][1], actor_critic, env)
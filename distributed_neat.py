@@ -0,0 +1,277 @@
+import argparse
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from multiprocessing.managers import BaseManager
+
+from flappy_neat import evaluate_genomes, end_generation
+from instrumentation import NULL_INSTRUMENTATION
+
+# NEAT generations spread over any number of hosts. run_NEAT(..., broker=TCPBroker(...))
+# publishes every generation as batches of genomes on the broker's task queue, workers
+# anywhere pull batches, evaluate them headless on the generation's seeded course with
+# flappy_neat.evaluate_genomes and put the fitnesses on the result queue.
+#
+#   python distributed_neat.py run --address :50000 --generations 50
+#   python distributed_neat.py worker --address trainer-host:50000 --processes 8
+#
+# A batch that is not back within timeout, e.g. because its worker died, is published
+# again, the first result of every batch wins. LocalBroker offers the same two queues
+# in process, with worker threads, to run everything without a network.
+
+DEFAULT_ADDRESS = ('', 50000)
+DEFAULT_AUTHKEY = b'flappy-neat'
+
+# Queues of the broker process, handed out by BrokerManager
+tasks = queue.Queue()
+results = queue.Queue()
+
+
+def get_tasks():
+    return tasks
+
+
+def get_results():
+    return results
+
+
+class BrokerManager(BaseManager):
+    pass
+
+
+BrokerManager.register('tasks', callable=get_tasks)
+BrokerManager.register('results', callable=get_results)
+
+
+class TCPBroker:
+
+    # With serve, starts the broker process listening on address, otherwise connects to
+    # one. tasks and results are proxies of its queues either way.
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=DEFAULT_AUTHKEY, serve=True):
+
+        self.manager = BrokerManager(address, authkey)
+        if serve:
+            self.manager.start()
+        else:
+            self.manager.connect()
+        self.serving = serve
+
+        self.tasks = self.manager.tasks()
+        self.results = self.manager.results()
+
+
+    def close(self):
+
+        if self.serving:
+            self.manager.shutdown()
+
+
+class LocalBroker:
+
+    # In-process stand-in of TCPBroker. start_workers runs run_worker in threads, close
+    # stops them.
+
+    def __init__(self):
+
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.stop = threading.Event()
+        self.threads = []
+
+
+    def start_workers(self, num_workers):
+
+        for _ in range(num_workers):
+            thread = threading.Thread(target=run_worker, args=(self, self.stop), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+
+    def close(self):
+
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+
+def run_worker(broker, stop=None, poll=0.5):
+
+    # Evaluates batches until stop is set or the broker goes away. Returns the number of
+    # batches evaluated.
+    evaluated = 0
+    while stop is None or not stop.is_set():
+        try:
+            task = broker.tasks.get(timeout=poll)
+        except queue.Empty:
+            continue
+        except (EOFError, ConnectionError):
+            break
+
+        generation, batch_id, genomes, config, seed, max_frames = task
+        try:
+            result = (generation, batch_id, evaluate_genomes(genomes, config, seed, max_frames), None)
+        except Exception:
+            result = (generation, batch_id, None, traceback.format_exc())
+
+        try:
+            broker.results.put(result)
+        except (EOFError, ConnectionError):
+            break
+        evaluated += 1
+
+    return evaluated
+
+
+def worker_process(address, authkey, connect_timeout=60.):
+
+    # Workers may be started before the broker, they keep trying to connect for a while
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            broker = TCPBroker(address, authkey, serve=False)
+            break
+        except ConnectionError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1.)
+
+    run_worker(broker)
+
+
+class DistributedEvaluator:
+
+    # Drop-in for flappy_neat.HeadlessEvaluator evaluating every generation through a
+    # broker. Genomes go out in batches of batch_size, all batches of a generation share
+    # one seed like the chunks of HeadlessEvaluator, so fitnesses do not depend on which
+    # worker played them. The instrumentation sees the whole generation as 'simulate'.
+
+    def __init__(self, broker, batch_size=50, seed=0, max_frames=None, timeout=120., instrumentation=None):
+
+        self.broker = broker
+        self.batch_size = batch_size
+        self.seed = seed
+        self.max_frames = max_frames
+        self.timeout = timeout
+        self.instrumentation = NULL_INSTRUMENTATION if instrumentation is None else instrumentation
+        self.generation = 0
+        self.redispatched = 0
+
+
+    def close(self):
+        self.drain()
+
+
+    def drain(self):
+
+        # Batches published again but answered by their first worker are left in the
+        # queue, they would only keep workers busy
+        try:
+            while True:
+                self.broker.tasks.get_nowait()
+        except queue.Empty:
+            pass
+
+
+    def evaluate(self, genomes, config):
+
+        seed = self.seed + self.generation
+        generation = self.generation
+        self.generation += 1
+
+        genomes = list(genomes)
+        max_frames = self.max_frames
+        if max_frames is None:
+            max_frames = int(config.fitness_threshold * 60) + 1
+
+        with self.instrumentation.phase('simulate'):
+            batches = [genomes[i:i + self.batch_size] for i in range(0, len(genomes), self.batch_size)]
+            fitnesses = self.collect(generation, batches, config, seed, max_frames)
+            self.drain()
+
+        for batch, batch_fitnesses in zip(batches, fitnesses):
+            for (_, genome), fitness in zip(batch, batch_fitnesses):
+                genome.fitness = fitness
+
+        if self.instrumentation.enabled:
+            end_generation(self.instrumentation, self.generation, [genome.fitness for _, genome in genomes])
+
+
+    def collect(self, generation, batches, config, seed, max_frames):
+
+        tasks = {batch_id: (generation, batch_id, batch, config, seed, max_frames) for batch_id, batch in enumerate(batches)}
+        deadlines = {}
+        for batch_id, task in tasks.items():
+            self.broker.tasks.put(task)
+            deadlines[batch_id] = time.monotonic() + self.timeout
+
+        fitnesses = [None] * len(batches)
+        while deadlines:
+            try:
+                result_generation, batch_id, batch_fitnesses, error = self.broker.results.get(
+                    timeout=max(min(deadlines.values()) - time.monotonic(), 0.01))
+            except queue.Empty:
+                now = time.monotonic()
+                for batch_id, deadline in deadlines.items():
+                    if deadline <= now:
+                        self.broker.tasks.put(tasks[batch_id])
+                        deadlines[batch_id] = now + self.timeout
+                        self.redispatched += 1
+                continue
+
+            # Results of earlier generations and second answers are dropped
+            if result_generation != generation or batch_id not in deadlines:
+                continue
+            if error is not None:
+                raise RuntimeError(f"Batch {batch_id} of generation {generation} failed on a worker:\n{error}")
+
+            fitnesses[batch_id] = batch_fitnesses
+            del deadlines[batch_id]
+
+        return fitnesses
+
+
+def parse_address(text):
+
+    host, _, port = text.rpartition(':')
+    return host, int(port)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Distributed NEAT training for Flappy Bird')
+    parser.add_argument('mode', choices=('run', 'worker'))
+    parser.add_argument('--address', default=':50000', help='host:port the broker listens on or workers connect to')
+    parser.add_argument('--authkey', default=DEFAULT_AUTHKEY.decode())
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='worker processes on this host')
+    parser.add_argument('--config', default='config_file.txt')
+    parser.add_argument('--generations', type=int, default=15)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--winner', default=None, help='file receiving the pickled best genome')
+    args = parser.parse_args(argv)
+
+    address = parse_address(args.address)
+    authkey = args.authkey.encode()
+
+    if args.mode == 'worker':
+        processes = [multiprocessing.Process(target=worker_process, args=(address, authkey)) for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return
+
+    from flappy_neat import run_NEAT
+
+    broker = TCPBroker(address, authkey)
+    try:
+        return run_NEAT(args.config, generations=args.generations, seed=args.seed, winner_filename=args.winner, broker=broker)
+    finally:
+        broker.close()
+
+
+if __name__ == '__main__':
+    main()
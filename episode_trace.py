@@ -0,0 +1,262 @@
+import argparse
+import collections
+import json
+import os
+import struct
+import numpy as np
+
+from flappy_sim import FlappySim
+from pipe_course import python_random
+from population_sim import PopulationSim
+
+# Compact episode traces. Dynamics only depend on the pipe heights and the actions, so an
+# episode is its seed, the number of pipes drawn from the seed before it started and
+# its actions, one bit per decision. A trace file is a sequence of records:
+#
+#   magic b'FBTR', version, header length and number of actions ('<4sBII')
+#   header, JSON with the env parameters
+#   actions, bit-packed in little bit order
+#
+# FlappyBirdEnv writes one record per episode and the NEAT env one per generation, where
+# every frame holds one bit per bird alive in it. A thousand A2C steps take about 125
+# bytes plus a header of roughly 150 bytes.
+#
+#   python episode_trace.py traces/a2c.trace --list
+#   python episode_trace.py traces/a2c.trace --episode 41 --last 60 --output images/replay
+
+MAGIC = b'FBTR'
+VERSION = 1
+RECORD = struct.Struct('<4sBII')
+
+Trace = collections.namedtuple('Trace', ['header', 'actions'])
+
+
+class TraceWriter:
+
+    # Appends one record per episode to path. Actions are kept one byte each until the
+    # episode ends, then packed and written with a single write, so the workers of a
+    # HeadlessEvaluator can append to the same file. info is added to every header.
+
+    def __init__(self, path):
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.file = open(path, 'ab')
+        self.info = {}
+        self.header = None
+        self.actions = bytearray()
+
+
+    def start_episode(self, header):
+
+        self.end_episode()
+        self.header = dict(header, **self.info)
+
+
+    def record(self, action):
+        self.actions.append(action)
+
+
+    def record_many(self, actions):
+        self.actions += np.asarray(actions, dtype=np.uint8).tobytes()
+
+
+    def end_episode(self):
+
+        # Episodes without a single decision leave no record
+        if self.header is not None and self.actions:
+            header = json.dumps(self.header, separators=(',', ':')).encode()
+            actions = np.packbits(np.frombuffer(self.actions, dtype=np.uint8), bitorder='little')
+            self.file.write(RECORD.pack(MAGIC, VERSION, len(header), len(self.actions)) + header + actions.tobytes())
+            self.file.flush()
+
+        self.header = None
+        self.actions = bytearray()
+
+
+    def close(self):
+
+        self.end_episode()
+        self.file.close()
+
+
+def read_traces(path):
+
+    # Yields every record of path as a Trace, a truncated last record is ignored
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        magic, version, header_length, num_actions = RECORD.unpack_from(data, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Got unexpected trace record - {magic} version {version}")
+
+        start = offset + RECORD.size
+        end = start + header_length + -(-num_actions // 8)
+        if end > len(data):
+            return
+
+        header = json.loads(data[start:start + header_length])
+        packed = np.frombuffer(data, dtype=np.uint8, count=end - start - header_length, offset=start + header_length)
+        yield Trace(header, np.unpackbits(packed, count=num_actions, bitorder='little'))
+        offset = end
+
+
+class TraceReplay:
+
+    # Re-simulates a Trace headless, one frame per step. Frame f is the world after f
+    # frames, frame 0 the one reset left. step returns False once the actions run out.
+    # With a pipe_course.PipeCourseCache the pipes of early episodes come from the
+    # cached course instead of replaying the pipe generator.
+
+    def __init__(self, trace, course_cache=None):
+
+        self.header = trace.header
+        self.actions = trace.actions
+        header = trace.header
+
+        size = tuple(header['size'])
+        if header['kind'] == 'bird':
+            self.sim = FlappySim(size, header['gravity'], header['jump_velocity'], seed=header['seed'], course_cache=course_cache,
+                                 physics=header.get('physics', 'float'))
+            self.frames_per_step = 1 + header['step_size']
+        elif header['kind'] == 'population':
+            self.sim = PopulationSim(size, header['gravity'], header['jump_velocity'], num_birds=len(header['bird_ys']),
+                                     seed=header['seed'], course_cache=course_cache, physics=header.get('physics', 'float'))
+        else:
+            raise ValueError(f"Got unexpected trace kind - {header['kind']}")
+
+        # Pipes continue the stream of the seed where the episode found it
+        sim = self.sim
+        pipe_index = header['pipe_index']
+        if sim.course is None or pipe_index >= len(sim.course):
+            sim.course = None
+            sim.pipe_random = python_random(header['seed'], sim.pipe_pos_range, pipe_index)
+        sim.pipe_index = pipe_index
+        sim.reset(header.get('bird_ys'))
+
+        self.frame = 0
+        self.position = 0
+        self.pipes_passed = 0
+        self.alive = np.ones(sim.num_birds, dtype=bool)
+        self.collision = None
+
+
+    def step(self):
+
+        sim = self.sim
+
+        if self.header['kind'] == 'bird':
+            decision, sub_frame = divmod(self.frame, self.frames_per_step)
+            if decision >= len(self.actions):
+                return False
+
+            # Same order as FlappyBirdEnv.step
+            if sub_frame == 0 and self.actions[decision]:
+                sim.flap(0)
+            sim.move_bird(0)
+            self.pipes_passed += sim.move_pipes()
+            sim.add_pipe()
+            self.collision = sim.check_collision(0)[1]
+
+        else:
+            active = np.flatnonzero(self.alive)
+            if len(active) == 0 or self.position + len(active) > len(self.actions):
+                return False
+
+            # Same order as the NEAT FlappyBirdEnv, pipes first, then the birds alive
+            self.pipes_passed += sim.move_pipes()
+            sim.add_pipe()
+            sim.move_birds(active, self.actions[self.position:self.position + len(active)] == 1)
+            self.position += len(active)
+            self.alive[active[sim.check_collisions(active)[0]]] = False
+
+        self.frame += 1
+        return True
+
+
+    def seek(self, frame):
+
+        # Simulates up to frame, returns False if the trace ends before
+        while self.frame < frame:
+            if not self.step():
+                return False
+
+        return True
+
+
+    def run(self):
+
+        while self.step():
+            pass
+
+        return self.frame
+
+
+def render_frames(trace, frames, directory='images/replay', course_cache=None):
+
+    # Renders only the given frames of trace as <directory>/<frame>.png, the frames in
+    # between are simulated headless. Returns the paths written.
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    from flappy_render import Renderer
+
+    os.makedirs(directory, exist_ok=True)
+    replay = TraceReplay(trace, course_cache)
+    renderer = Renderer(replay.sim.SIZE, throttle=False)
+    generation = trace.header.get('generation')
+
+    paths = []
+    for frame in sorted(set(frames)):
+        if not replay.seek(frame):
+            break
+
+        # Floor and wing animation follow the frame like in an episode rendered from its start
+        renderer.frames_drawn = max(frame - 1, 0)
+        renderer.floor_x_pos = -(renderer.frames_drawn % replay.sim.SIZE[0])
+        renderer.draw(replay.sim, replay.alive, None if generation is None else f"Generation : {generation}")
+
+        path = os.path.join(directory, f'{frame}.png')
+        pygame.image.save(renderer.screen, path)
+        paths.append(path)
+
+    return paths
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='List and render Flappy Bird episode traces')
+    parser.add_argument('path', help='trace file written by a TraceWriter')
+    parser.add_argument('--list', action='store_true', help='print one line per episode and exit')
+    parser.add_argument('--episode', type=int, default=-1, help='index of the record, negative from the end')
+    parser.add_argument('--frames', type=int, nargs='*', default=[], help='frames to render')
+    parser.add_argument('--last', type=int, default=0, help='also render the last that many frames')
+    parser.add_argument('--output', default='images/replay', help='directory receiving <frame>.png')
+    args = parser.parse_args(argv)
+
+    traces = list(read_traces(args.path))
+    if args.list:
+        for index, trace in enumerate(traces):
+            print(index, json.dumps(trace.header), f"{len(trace.actions)} actions")
+        return
+
+    trace = traces[args.episode]
+    replay = TraceReplay(trace)
+    num_frames = replay.run()
+    if trace.header['kind'] == 'bird':
+        print(f"{num_frames} frames, {replay.pipes_passed} pipes passed, collision {replay.collision}")
+    else:
+        print(f"{num_frames} frames, {replay.pipes_passed} pipes passed, {replay.alive.sum()} birds alive")
+
+    frames = list(args.frames)
+    if args.last:
+        frames += range(max(num_frames - args.last + 1, 1), num_frames + 1)
+
+    if frames:
+        paths = render_frames(trace, frames, args.output)
+        print(f"Rendered {len(paths)} frames to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
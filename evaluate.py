@@ -0,0 +1,183 @@
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+
+from flappy_sim import COLLISION_PLACES
+from numpy_policy import export_model, load_policy
+from pipe_course import shared_cache
+from vector_env import VectorFlappyEnv
+
+# Scores a trained agent over a fixed set of seeded episodes with greedy actions.
+#
+#   python evaluate.py --policy models/actor.h5 --episodes 5000 --output actor_eval.jsonl
+#   python evaluate.py --genome winner.pkl --episodes 5000 --score-cap 200
+#
+# Episodes are simulated batch_size at a time in one VectorFlappyEnv, one episode per
+# world, and every batch is seeded from (seed, batch index). The episode set is therefore
+# the same whatever the number of processes. Every world plays exactly one episode, so
+# long episodes are not crowded out by short ones.
+
+# Set in every worker process by init_worker
+policy = None
+
+# Courses of the worlds of a batch are kept in memory only, see pipe_course.shared_cache
+course_cache = shared_cache()
+
+
+def init_worker(policy_path, genome, config_filename):
+
+    global policy
+    policy = load_policy(policy_path, genome, config_filename)
+
+
+def run_batch(batch_index, batch_size, seed, score_cap, neat_physics):
+
+    # NEAT birds decide every frame with a stronger jump, in the frame order of
+    # flappy_neat.FlappyBirdEnv and from a random height
+    if neat_physics:
+        options = {'jump_velocity': -4, 'step_size': 0, 'frame_order': 'neat', 'random_start': True}
+    else:
+        options = {'jump_velocity': -3, 'step_size': 4}
+    env = VectorFlappyEnv(batch_size, seed=np.random.SeedSequence(seed, spawn_key=(batch_index,)), course_cache=course_cache, **options)
+
+    state = env.reset()
+    playing = np.ones(batch_size, dtype=bool)
+    steps = np.zeros(batch_size, dtype=np.int64)
+    rewards = np.zeros(batch_size)
+    results = [None] * batch_size
+
+    while playing.any():
+
+        state, reward, done = env.step(policy.act(state))
+        steps += playing
+        rewards += reward * playing
+
+        for world in np.flatnonzero(done & playing):
+            results[world] = (int(env.last_pipes_passed[world]), COLLISION_PLACES[env.last_collision[world]])
+        playing &= ~done
+
+        if score_cap:
+            capped = playing & (env.pipes_passed >= score_cap)
+            for world in np.flatnonzero(capped):
+                results[world] = (int(env.pipes_passed[world]), None)
+            playing &= ~capped
+
+    return [{'episode': batch_index * batch_size + world,
+             'pipes': pipes,
+             'frames': int(steps[world]) * (1 + env.step_size),
+             'reward': round(float(rewards[world]), 4),
+             'collision': collision,
+             'capped': collision is None}
+            for world, (pipes, collision) in enumerate(results)]
+
+
+def run_batch_star(args):
+    return run_batch(*args)
+
+
+def confidence_interval(values, z=1.96):
+
+    # Mean and half width of its normal approximation interval
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return float(values.mean()), float('nan')
+
+    return float(values.mean()), float(z * values.std(ddof=1) / np.sqrt(len(values)))
+
+
+def summarize(episodes):
+
+    summary = {'episodes': len(episodes)}
+    for key in ('pipes', 'frames', 'reward'):
+        mean, half_width = confidence_interval([episode[key] for episode in episodes])
+        summary[key] = {'mean': mean, 'ci95': half_width}
+
+    for place in COLLISION_PLACES[1:] + ('capped',):
+        hits = [episode['collision'] == place if place != 'capped' else episode['capped'] for episode in episodes]
+        mean, half_width = confidence_interval(hits)
+        summary[f'{place.lower()}_rate'] = {'mean': mean, 'ci95': half_width}
+
+    return summary
+
+
+def evaluate(policy_path=None, genome=None, config_filename='config_file.txt', num_episodes=1000, batch_size=64,
+             num_workers=None, seed=0, score_cap=1000, output=None):
+
+    num_workers = os.cpu_count() if num_workers is None else num_workers
+
+    # Workers only need NumPy, a keras actor is exported once up front
+    temp_dir = None
+    if genome is None and policy_path.endswith('.h5'):
+        temp_dir = tempfile.TemporaryDirectory()
+        exported = os.path.join(temp_dir.name, 'actor.npy')
+        export_model(policy_path, exported)
+        policy_path = exported
+
+    num_batches = -(-num_episodes // batch_size)
+    batches = [(i, batch_size, seed, score_cap, genome is not None) for i in range(num_batches)]
+
+    episodes = []
+    out = open(output, 'w') if output is not None else None
+    pool = None
+    start = time.perf_counter()
+    try:
+        if num_workers <= 1:
+            init_worker(policy_path, genome, config_filename)
+            results = map(run_batch_star, batches)
+        else:
+            # spawn keeps TensorFlow state of the parent out of the workers
+            pool = multiprocessing.get_context('spawn').Pool(num_workers, init_worker, (policy_path, genome, config_filename))
+            results = pool.imap_unordered(run_batch_star, batches)
+
+        # Episodes are streamed to output as soon as their batch finishes
+        for batch in results:
+            batch = [episode for episode in batch if episode['episode'] < num_episodes]
+            episodes.extend(batch)
+            if out is not None:
+                out.writelines(json.dumps(episode) + '\n' for episode in batch)
+                out.flush()
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if out is not None:
+            out.close()
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    summary = summarize(sorted(episodes, key=lambda episode: episode['episode']))
+    summary['seconds'] = time.perf_counter() - start
+
+    return summary
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Evaluate a trained Flappy Bird agent')
+    parser.add_argument('--policy', default='models/actor.h5', help='keras .h5 actor or numpy_policy export')
+    parser.add_argument('--genome', default=None, help='pickled neat genome, evaluated instead of --policy')
+    parser.add_argument('--config', default='config_file.txt', help='neat config of --genome')
+    parser.add_argument('--episodes', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=64, help='episodes simulated together in one vector env')
+    parser.add_argument('--workers', type=int, default=None, help='processes, all cores by default')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--score-cap', type=int, default=1000, help='episodes end after this many pipes, 0 for no cap')
+    parser.add_argument('--output', default=None, help='JSONL file receiving one line per episode')
+    args = parser.parse_args(argv)
+
+    summary = evaluate(args.policy, args.genome, args.config, args.episodes, args.batch_size,
+                       args.workers, args.seed, args.score_cap, args.output)
+
+    print(f"{summary['episodes']} episodes in {summary['seconds']:.1f}s")
+    for key, stats in summary.items():
+        if isinstance(stats, dict):
+            print(f"{key:>14}: {stats['mean']:.4f} +/- {stats['ci95']:.4f}")
+
+    return summary
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+import argparse
+import random
+import numpy as np
+
+from flappy_sim import FRACTION_BITS, fixed_move, to_fixed
+
+# Reference of the fixed point physics and its conformance with the float game.
+#
+# A bird sits on a whole pixel y and has a velocity v in 1/SCALE px per frame. Every frame
+# v becomes the jump velocity on a flap, then gravity is added and y moves by v truncated
+# toward zero, which is what int() does to the float position of the original game. With
+# gravity and jump velocities that are multiples of 1/SCALE px, both are exact and every
+# backend (FlappySim, PopulationSim, VectorFlappyEnv, their workers) gives the same birds.
+#
+#   python fixed_point.py --episodes 200
+
+SCALE = 1 << FRACTION_BITS
+
+
+def reference_frame(y, velocity, gravity, jump_velocity, flap):
+
+    # One frame of one bird with plain integer arithmetic, gravity and velocities in 1/SCALE px
+    if flap:
+        velocity = jump_velocity
+    velocity += gravity
+
+    position = y * SCALE + velocity
+    y = position // SCALE if position >= 0 else -(-position // SCALE)
+
+    return y, velocity
+
+
+def check_reference(gravity=0.25, jump_velocities=(-3, -4), y_range=(-100, 700), max_velocity=40):
+
+    # Every velocity a bird can reach against every whole pixel y, float game against the
+    # reference and against flappy_sim.fixed_move
+    gravity_fixed = to_fixed(gravity)
+    jump_fixed = [to_fixed(jump_velocity) for jump_velocity in jump_velocities]
+    checked = 0
+
+    for velocity in range(min(jump_fixed) + gravity_fixed, to_fixed(max_velocity), gravity_fixed):
+        float_velocity = velocity / SCALE
+        for y in range(*y_range):
+            expected = int(y + float_velocity)
+            reference, _ = reference_frame(y, velocity - gravity_fixed, gravity_fixed, 0, False)
+            if not expected == reference == fixed_move(y, velocity):
+                raise AssertionError(f"y {y} velocity {float_velocity}: float {expected}, reference {reference}, "
+                                     f"fixed_move {fixed_move(y, velocity)}")
+            checked += 1
+
+    for jump_velocity in jump_fixed:
+        for velocity in range(jump_velocity, to_fixed(max_velocity), gravity_fixed):
+            y, new_velocity = reference_frame(300, velocity, gravity_fixed, jump_velocity, True)
+            if new_velocity != jump_velocity + gravity_fixed or y != int(300 + new_velocity / SCALE):
+                raise AssertionError(f"flap from velocity {velocity / SCALE}: y {y} velocity {new_velocity / SCALE}")
+            checked += 1
+
+    return checked
+
+
+def check_env(episodes, seed):
+
+    # flappy_env.FlappyBirdEnv, one float and one fixed env stepped alike
+    from flappy_env import FlappyBirdEnv
+
+    envs = [FlappyBirdEnv(seed=seed, physics=physics) for physics in ('float', 'fixed')]
+    rng = random.Random(seed)
+    steps = 0
+
+    for episode in range(episodes):
+        observations = [env.reset() for env in envs]
+        if observations[0] != observations[1]:
+            raise AssertionError(f"FlappyBirdEnv episode {episode} reset: float {observations[0]}, fixed {observations[1]}")
+        done = False
+        while not done:
+            action = int(rng.random() < 0.1)
+            results = [env.step(action) for env in envs]
+            birds = [(env.sim.bird_ys[0], env.bird_velocity) for env in envs]
+            if results[0] != results[1] or birds[0] != birds[1]:
+                raise AssertionError(f"FlappyBirdEnv episode {episode} step {steps}: float {results[0]} {birds[0]}, "
+                                     f"fixed {results[1]} {birds[1]}")
+            done = results[0][2]
+            steps += 1
+
+    return steps
+
+
+def check_population(generations, seed, population=64):
+
+    # flappy_neat.FlappyBirdEnv on a PopulationSim, the whole population moved at once
+    from flappy_neat import FlappyBirdEnv
+
+    envs = [FlappyBirdEnv(population=population, render=False, seed=seed, physics=physics) for physics in ('float', 'fixed')]
+    rng = np.random.default_rng(seed)
+    frames = 0
+
+    for generation in range(generations):
+        for env in envs:
+            env.reset()
+
+        while len(envs[0].active):
+            actions = (rng.random(len(envs[0].active)) < 0.1).astype(np.int64)
+            for env in envs:
+                env.move_pipes()
+                env.step_population(actions)
+
+            if not (np.array_equal(envs[0].sim.bird_ys, envs[1].sim.bird_ys)
+                    and np.array_equal(envs[0].active, envs[1].active)):
+                raise AssertionError(f"PopulationSim generation {generation} frame {frames}: birds differ")
+            frames += 1
+
+    return frames
+
+
+def check_vector(steps, seed, num_envs=64):
+
+    from vector_env import VectorFlappyEnv
+
+    envs = [VectorFlappyEnv(num_envs, seed=seed, physics=physics) for physics in ('float', 'fixed')]
+    rng = np.random.default_rng(seed)
+    for env in envs:
+        env.reset()
+
+    for step in range(steps):
+        actions = (rng.random(num_envs) < 0.1).astype(np.int64)
+        results = [env.step(actions) for env in envs]
+        same = all(np.array_equal(a, b) for a, b in zip(*results)) and np.array_equal(envs[0].bird_y, envs[1].bird_y)
+        if not same:
+            raise AssertionError(f"VectorFlappyEnv step {step}: worlds differ")
+
+    return steps * num_envs
+
+
+def check_conformance(episodes=100, seed=0):
+
+    # Raises AssertionError at the first difference, returns what was compared
+    return {'reference_cases': check_reference(),
+            'env_steps': check_env(episodes, seed),
+            'population_frames': check_population(max(episodes // 10, 1), seed),
+            'vector_world_steps': check_vector(episodes * 10, seed)}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Check the fixed point physics against the float game')
+    parser.add_argument('--episodes', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for name, count in check_conformance(args.episodes, args.seed).items():
+        print(f"{name:>20}: {count} identical")
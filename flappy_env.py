@@ -1,181 +1,125 @@
-import pygame
-import sys
-import random
-from collections import deque
+from flappy_sim import FlappySim, seed_env
+from instrumentation import NULL_INSTRUMENTATION
+from observations import make_observation
 
 class FlappyBirdEnv:
 
-    def __init__(self, size=(400, 600), gravity=0.25, frame_rate=60, render=False):
+    def __init__(self, size=(400, 600), gravity=0.25, frame_rate=60, render=False, render_every=None, throttle=True, recorder=None, seed=None, instrumentation=None, course_cache=None, trace=None, physics='float',
+                 step_size=4, observation='basic', downsample=8):
 
         self.SIZE = size
-        self.GRAVITY = gravity 
+        self.GRAVITY = gravity
         self.FRAME_RATE = frame_rate
-        self.observation_shape = 2
         self.action_shape = 2
-        self.bird_velocity = 0.
         self.jump_velocity = -3
-        self.TB_PIPE_GAP = int(0.25 * self.SIZE[1])
-        self.SS_PIPE_GAP = self.SIZE[0] // 2
-        self.GROUNDY = int(0.85 * self.SIZE[1])
-
-        self.pipe_moving_freq = 3
-        self.pipe_list = deque(maxlen=4)
-
-        self.step_size = 4
-        self.image_counter = 0
 
+        # Every action is played on one frame followed by step_size no-op frames, the
+        # observation is built by one of observations.OBSERVATIONS
+        if step_size < 0:
+            raise ValueError(f"Got unexpected step_size - {step_size}")
+        self.step_size = step_size
+        self.observe = make_observation(observation, self.SIZE, downsample)
+        self.observation_shape = self.observe.observation_shape
+
+        # A pipe_course.PipeCourseCache serves the pipe heights of seeded runs
+        # physics 'fixed' runs the bird on integers, see flappy_sim.PHYSICS
+        self.sim = FlappySim(self.SIZE, self.GRAVITY, self.jump_velocity, course_cache=course_cache, physics=physics)
+
+        # An episode_trace.TraceWriter receiving one record per episode, written when the
+        # next episode starts or the writer is closed
+        self.trace = trace
+        self.seed(seed)
+
+        # The game clock only counts frames, wall time is spent on rendering alone. Every
+        # episode is shown with render, every render_every-th one with render_every, and
+        # render can be switched on for evaluation episodes only. Frames are saved only
+        # when a flappy_render.FrameRecorder or AsyncRecorder is given.
         self.render = render
-        if self.render:
-
-            pygame.init()
-            self.screen = pygame.display.set_mode(self.SIZE)
-            self.clock = pygame.time.Clock()
-            
-            # Background Surface
-            self.bg_surface = pygame.image.load('assets/background-day.png').convert()
-            self.bg_surface = pygame.transform.scale(self.bg_surface, self.SIZE)
-
-            # Floor surface
-            self.floor_surface = pygame.image.load('assets/base.png').convert()
-            self.floor_surface = pygame.transform.scale(self.floor_surface, (self.SIZE[0], self.floor_surface.get_height()))
-            self.floor_x_pos = 0
-
-            # Bird surface
-            self.bird_surface = pygame.image.load('assets/bluebird-midflap.png').convert_alpha()
-            self.start_bird_pos = [int(0.2 * self.SIZE[0]), int(0.425 * self.SIZE[1])]
-            self.bird_rect = self.bird_surface.get_rect(center=self.start_bird_pos)
-
-            # Pipes
-            self.pipe_surface = pygame.image.load('assets/pipe-green.png').convert()
-            self.bottom_pipe_list = deque(maxlen=4)
-            self.top_pipe_list = deque(maxlen=4)
-
-        else:        
-            # Bird surface
-            self.bird_surface = pygame.image.load('assets/bluebird-midflap.png')
-            self.start_bird_pos = [int(0.2 * self.SIZE[0]), int(0.425 * self.SIZE[1])]
-            self.bird_rect = self.bird_surface.get_rect(center=self.start_bird_pos)
-
-            # Pipes
-            self.pipe_surface = pygame.image.load('assets/pipe-green.png')
-            self.bottom_pipe_list = deque(maxlen=4)
-            self.top_pipe_list = deque(maxlen=4)
-        
-        self.add_pipe()
-
-
-    def add_pipe(self):
-    
-        if (not self.bottom_pipe_list) or (int(self.SIZE[0] + self.pipe_surface.get_width() // 2) - self.bottom_pipe_list[-1].centerx >= self.SS_PIPE_GAP):
-
-            random_pipe_pos = random.randint(int(0.4 * self.SIZE[1]), int(0.75 * self.SIZE[1]))
-
-            bottom_pipepos = [int(self.SIZE[0] + self.pipe_surface.get_width() // 2), random_pipe_pos]
-            top_pipepos = [int(self.SIZE[0] + self.pipe_surface.get_width() // 2), random_pipe_pos - self.TB_PIPE_GAP]
-
-            bottom_pipe = self.pipe_surface.get_rect(midtop=bottom_pipepos)
-            top_pipe = self.pipe_surface.get_rect(midbottom=top_pipepos)
-        
-            self.bottom_pipe_list.append(bottom_pipe)
-            self.top_pipe_list.append(top_pipe)
-            self.pipe_list.append([int(self.SIZE[0] + self.pipe_surface.get_width() // 2), random_pipe_pos - (self.TB_PIPE_GAP // 2)])
+        self.render_every = render_every
+        self.throttle = throttle
+        self.recorder = recorder
+        self.renderer = None
+        self.rendering = render
+        self.episode = 0
 
-    
-    def check_collision(self):
+        # instrumentation.Instrumentation timing simulate and render, counting frames and
+        # collisions. Without one step runs as is.
+        self.instrumentation = NULL_INSTRUMENTATION if instrumentation is None else instrumentation
+        if instrumentation is not None:
+            self.step = self.instrumented_step
 
-        for pipe in self.bottom_pipe_list:
-            if self.bird_rect.colliderect(pipe):
-                return True, 'PIPE'
-        
-        for pipe in self.top_pipe_list:
-            if self.bird_rect.colliderect(pipe):
-                return True, 'PIPE'
 
-        if self.bird_rect.top <= 0:
-            return True, 'TOP'
-        
-        if self.bird_rect.bottom >=  int(0.85 * self.SIZE[1]):
-            return True, 'BOTTOM'
-        
-        return False, None
+    @property
+    def bird_velocity(self):
+        return self.sim.bird_velocity(0)
 
 
-    def draw_floor(self):
-
-        self.screen.blit(self.floor_surface, (self.floor_x_pos, self.GROUNDY))
-        self.screen.blit(self.floor_surface, (self.floor_x_pos + self.SIZE[0], int(0.85 * self.SIZE[1])))
+    def get_observation(self):
+        return self.observe(self.sim, 0)
 
-        self.floor_x_pos -= 1
-        if self.floor_x_pos <= -self.SIZE[0]:
-            self.floor_x_pos = 0
 
+    def get_renderer(self):
 
-    def draw_bird(self):
+        if self.renderer is None:
+            from flappy_render import Renderer
+            self.renderer = Renderer(self.SIZE, self.FRAME_RATE, self.throttle)
 
-        rotated_bird = pygame.transform.rotozoom(self.bird_surface, - self.bird_velocity * 5, 1)
-        self.screen.blit(rotated_bird, self.bird_rect)
+        return self.renderer
 
 
-    def draw_pipes(self):
+    def seed(self, seed=None):
 
-        for pipe in self.bottom_pipe_list:
+        self.action_random = seed_env(self.sim, seed, 'actions', self.trace is not None)
 
-            self.screen.blit(self.pipe_surface, pipe)
-        
-        for pipe in self.top_pipe_list:
 
-            flip_pipe = pygame.transform.flip(self.pipe_surface, False, True)
-            self.screen.blit(flip_pipe, pipe)
-    
+    def getstate(self):
 
-    def get_observation(self):
+        # Generator states and the episode counter, enough to continue a run of whole
+        # episodes since every episode starts with reset
+        return {'pipes': self.sim.pipe_random.getstate(),
+                'noise': self.sim.noise_random.getstate(),
+                'actions': self.action_random.getstate(),
+                'pipe_index': self.sim.pipe_index,
+                'episode': self.episode}
 
-        # Observation state will be [height from ground, bird_velocity
-        # height at which next gap is there, horizontal distance between next pipe and bird]
 
-        observation = [
-            self.bird_rect.centery - self.pipe_list[0][1] + random.random(),
-            self.pipe_list[0][0] - self.bird_rect.centerx + random.random()]
-        
-        return observation
+    def setstate(self, state):
 
-    
-    def move_bird(self):
-        self.bird_rect.centery += self.bird_velocity
+        self.sim.pipe_random.setstate(state['pipes'])
+        self.sim.noise_random.setstate(state['noise'])
+        self.action_random.setstate(state['actions'])
+        self.episode = state['episode']
 
+        # A cached course is seeked to where the saved run was, or left if it got past it
+        self.sim.pipe_index = state['pipe_index']
+        if self.sim.course is not None and self.sim.pipe_index >= len(self.sim.course):
+            self.sim.course = None
 
-    def move_pipes(self):
 
-        for i in range(len(self.bottom_pipe_list)):
+    def reset(self, seed=None):
 
-            self.bottom_pipe_list[i].centerx -= self.pipe_moving_freq
-            self.top_pipe_list[i].centerx -= self.pipe_moving_freq
-        
-        for i in range(len(self.pipe_list)):
+        if seed is not None:
+            self.seed(seed)
 
-            self.pipe_list[i][0] -= self.pipe_moving_freq
+        self.rendering = self.render or (self.render_every is not None and self.episode % self.render_every == 0)
+        if self.trace is not None:
+            self.trace.start_episode({'kind': 'bird', 'size': self.SIZE, 'gravity': self.GRAVITY,
+                                      'jump_velocity': self.jump_velocity, 'step_size': self.step_size,
+                                      'seed': self.sim.course_seed, 'pipe_index': self.sim.pipe_index,
+                                      'physics': self.sim.physics, 'episode': self.episode})
 
-        if self.pipe_list[0][0] <= self.bird_rect.centerx:
-            self.pipe_list.popleft()
-            return True
-        
-        return False
-    
-    def reset(self):
+        self.episode += 1
+        self.sim.reset()
 
-        self.bird_velocity = 0.
-        self.bottom_pipe_list.clear()
-        self.top_pipe_list.clear()
-        self.pipe_list.clear()
-        self.bird_rect.centery = self.start_bird_pos[1]
-        self.add_pipe()
+        if self.rendering and self.recorder is not None:
+            self.recorder.start_episode()
 
         return self.get_observation()
 
 
     def sample_action(self):
 
-        return random.choice([0, 1])
+        return self.action_random.choice([0, 1])
 
     def step(self, action):
 
@@ -184,38 +128,28 @@ class FlappyBirdEnv:
 
         for action in actions:
             if action == 1:
-                self.bird_velocity = self.jump_velocity
+                self.sim.flap(0)
             elif action == 0:
                 pass
             else:
                 raise ValueError(f"Got unexpected action - {action}")
-            
-            self.bird_velocity += self.GRAVITY
-            self.move_bird()
-            ret = self.move_pipes()
-            self.add_pipe()
-
-            if self.render:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        pygame.quit()
-                        sys.exit()
-                    if event.type == pygame.KEYDOWN:
-                        if event.key == pygame.K_UP:
-                            self.bird_velocity = self.jump_velocity
-            
-                self.screen.blit(self.bg_surface, (0, 0))
-                self.draw_bird()
-                self.draw_pipes()
-                self.draw_floor()
-
-                pygame.display.update()
-                self.clock.tick(self.FRAME_RATE)
-
-                pygame.image.save(self.screen, f"images/{self.image_counter}.png")
-                self.image_counter += 1
-
-            is_collided, place_of_collision = self.check_collision()
+
+            self.sim.move_bird(0)
+            ret = self.sim.move_pipes()
+            self.sim.add_pipe()
+
+            if self.rendering:
+                with self.instrumentation.phase('render'):
+                    renderer = self.get_renderer()
+                    if renderer.handle_events():
+                        self.sim.flap(0)
+
+                    renderer.draw(self.sim)
+
+                    if self.recorder is not None:
+                        self.recorder.capture(renderer.screen)
+
+            is_collided, place_of_collision = self.sim.check_collision(0)
 
             if is_collided:
                 if place_of_collision == 'TOP':
@@ -227,6 +161,21 @@ class FlappyBirdEnv:
             elif ret:
                 reward = 10
 
+        if self.trace is not None:
+            self.trace.record(actions[0])
 
         return self.get_observation(), reward, is_collided
 
+
+    def instrumented_step(self, action):
+
+        instrumentation = self.instrumentation
+        with instrumentation.phase('simulate'):
+            observation, reward, is_collided = FlappyBirdEnv.step(self, action)
+
+        instrumentation.count('frames', 1 + self.step_size)
+        if is_collided:
+            instrumentation.count('episodes')
+            instrumentation.count(f'collisions_{self.sim.check_collision(0)[1].lower()}')
+
+        return observation, reward, is_collided
@@ -1,240 +1,198 @@
-import pygame
-import sys
+import gzip
+import os
+import pickle
 import random
-from collections import deque
+import re
+import multiprocessing
+import numpy as np
 import neat
 
+from flappy_sim import COLLISION_PLACES, seed_env
+from instrumentation import NULL_INSTRUMENTATION
+from population_sim import PopulationSim
+from neat_compile import PopulationNetwork
+from checkpoint import atomic_write
+from pipe_course import shared_cache
+from episode_trace import TraceWriter
+
 class FlappyBirdEnv:
 
-    def __init__(self, size=(400, 600), gravity=0.25, frame_rate=60, population=10):
+    def __init__(self, size=(400, 600), gravity=0.25, frame_rate=60, population=10, render=True, seed=None, throttle=True, recorder=None, instrumentation=None, course_cache=None, trace=None, physics='float'):
 
         self.SIZE = size
         self.GRAVITY = gravity 
         self.FRAME_RATE = frame_rate
         self.observation_shape = 2
         self.action_shape = 2
-        self.bird_velocities = [0 for _ in range(population)]
         self.jump_velocity = -4
-        self.TB_PIPE_GAP = int(0.25 * self.SIZE[1])
-        self.SS_PIPE_GAP = self.SIZE[0] // 2
-        self.GROUNDY = int(0.85 * self.SIZE[1])
-
-        self.pipe_moving_freq = 3
-        self.pipe_list = deque(maxlen=4)
 
-        self.image_counter = 0
         self.population = population
 
-        pygame.init()
-        self.screen = pygame.display.set_mode(self.SIZE)
-        self.clock = pygame.time.Clock()
-        
-        # Background Surface
-        self.bg_surface = pygame.image.load('assets/background-day.png').convert()
-        self.bg_surface = pygame.transform.scale(self.bg_surface, self.SIZE)
-
-        # Floor surface
-        self.floor_surface = pygame.image.load('assets/base.png').convert()
-        self.floor_surface = pygame.transform.scale(self.floor_surface, (self.SIZE[0], self.floor_surface.get_height()))
-        self.floor_x_pos = 0
-
-        # Birds surface
-        
-        self.bird_surface = pygame.image.load('assets/bluebird-midflap.png').convert_alpha()
-        self.bird_rects = []
-        self.isAlive = []
-        self.start_bird_pos = [int(0.2 * self.SIZE[0]), int(0.425 * self.SIZE[1])]
-
-        for _ in range(self.population):
-            bird_rect = self.bird_surface.get_rect(center=(self.start_bird_pos[0], random.randint(int(self.SIZE[1] * 0.1), int(0.8 * self.SIZE[1]))))
-            self.bird_rects.append(bird_rect) 
-            self.isAlive.append(True)       
-
-        # Pipes
-        self.pipe_surface = pygame.image.load('assets/pipe-green.png').convert()
-        self.bottom_pipe_list = deque(maxlen=4)
-        self.top_pipe_list = deque(maxlen=4)
-        
-        # Font
-        self.font = pygame.font.Font('freesansbold.ttf', 16)
-
-        self.add_pipe()
-
-
-    def add_pipe(self):
-    
-        if (not self.bottom_pipe_list) or (int(self.SIZE[0] + self.pipe_surface.get_width() // 2) - self.bottom_pipe_list[-1].centerx >= self.SS_PIPE_GAP):
+        # Birds live in arrays, active holds the indices of the birds still alive
+        self.sim = PopulationSim(self.SIZE, self.GRAVITY, self.jump_velocity, num_birds=population, course_cache=course_cache,
+                                 physics=physics)
+        self.instrumentation = NULL_INSTRUMENTATION if instrumentation is None else instrumentation
+        self.isAlive = np.ones(self.population, dtype=bool)
+        self.active = np.arange(self.population)
 
-            random_pipe_pos = random.randint(int(0.4 * self.SIZE[1]), int(0.75 * self.SIZE[1]))
+        # An episode_trace.TraceWriter receiving one record per generation, every frame
+        # holds the actions of the birds alive in it
+        self.trace = trace
+        self.seed(seed)
+        self.reset()
 
-            bottom_pipepos = [int(self.SIZE[0] + self.pipe_surface.get_width() // 2), random_pipe_pos]
-            top_pipepos = [int(self.SIZE[0] + self.pipe_surface.get_width() // 2), random_pipe_pos - self.TB_PIPE_GAP]
+        # Frames are saved only when a flappy_render.FrameRecorder or AsyncRecorder is given
+        self.render = render
+        self.recorder = recorder
+        self.renderer = None
+        if self.render:
+            from flappy_render import Renderer
+            self.renderer = Renderer(self.SIZE, self.FRAME_RATE, throttle)
 
-            bottom_pipe = self.pipe_surface.get_rect(midtop=bottom_pipepos)
-            top_pipe = self.pipe_surface.get_rect(midbottom=top_pipepos)
-        
-            self.bottom_pipe_list.append(bottom_pipe)
-            self.top_pipe_list.append(top_pipe)
-            self.pipe_list.append([int(self.SIZE[0] + self.pipe_surface.get_width() // 2), random_pipe_pos - (self.TB_PIPE_GAP // 2)])
 
-    
-    def check_collision(self, bird_index):
-
-        for pipe in self.bottom_pipe_list:
-            if self.bird_rects[bird_index].colliderect(pipe):
-                return True, 'PIPE'
-        
-        for pipe in self.top_pipe_list:
-            if self.bird_rects[bird_index].colliderect(pipe):
-                return True, 'PIPE'
+    def get_observation(self, bird_index):
 
-        if self.bird_rects[bird_index].top <= 0:
-            return True, 'TOP'
-        
-        if self.bird_rects[bird_index].bottom >=  int(0.85 * self.SIZE[1]):
-            return True, 'BOTTOM'
-        
-        return False, None
+        # Observation state will be [height from ground, bird_velocity
+        # height at which next gap is there, horizontal distance between next pipe and bird]
 
+        return self.sim.get_observation(bird_index)
 
-    def draw_floor(self):
 
-        self.screen.blit(self.floor_surface, (self.floor_x_pos, self.GROUNDY))
-        self.screen.blit(self.floor_surface, (self.floor_x_pos + self.SIZE[0], int(0.85 * self.SIZE[1])))
+    def get_observations(self):
 
-        self.floor_x_pos -= 1
-        if self.floor_x_pos <= -self.SIZE[0]:
-            self.floor_x_pos = 0
+        # Observations of all active birds, [len(self.active), 2]
+        return self.sim.get_observations(self.active)
 
 
-    def draw_birds(self):
+    def seed(self, seed=None):
 
-        for bird_index in range(self.population):
-            if self.isAlive[bird_index]:
-                rotated_bird = pygame.transform.rotozoom(self.bird_surface, - self.bird_velocities[bird_index] * 5, 1)
-                self.screen.blit(rotated_bird, self.bird_rects[bird_index])
+        self.random = seed_env(self.sim, seed, 'birds', self.trace is not None)
 
 
-    def draw_pipes(self):
+    def random_bird_y(self, rng=None):
 
-        for pipe in self.bottom_pipe_list:
+        rng = self.random if rng is None else rng
+        return rng.randint(int(self.SIZE[1] * 0.1), int(0.8 * self.SIZE[1]))
 
-            self.screen.blit(self.pipe_surface, pipe)
-        
-        for pipe in self.top_pipe_list:
 
-            flip_pipe = pygame.transform.flip(self.pipe_surface, False, True)
-            self.screen.blit(flip_pipe, pipe)
-    
+    def reset(self, bird_ys=None, seed=None):
 
-    def get_observation(self, bird_index):
+        if seed is not None:
+            self.seed(seed)
 
-        # Observation state will be [height from ground, bird_velocity
-        # height at which next gap is there, horizontal distance between next pipe and bird]
+        if bird_ys is None:
+            bird_ys = [self.random_bird_y() for _ in range(self.population)]
 
-        observation = [
-            self.bird_rects[bird_index].centery - self.pipe_list[0][1] + random.random(),
-            self.pipe_list[0][0] - self.bird_rects[bird_index].centerx + random.random()]
-        
-        return observation
+        if self.trace is not None:
+            self.trace.start_episode({'kind': 'population', 'size': self.SIZE, 'gravity': self.GRAVITY,
+                                      'jump_velocity': self.jump_velocity, 'seed': self.sim.course_seed,
+                                      'pipe_index': self.sim.pipe_index, 'physics': self.sim.physics,
+                                      'bird_ys': [int(y) for y in bird_ys]})
 
-    
-    def move_bird(self, bird_index):
-        self.bird_rects[bird_index].centery += self.bird_velocities[bird_index]
+        self.sim.reset(bird_ys)
+        self.isAlive[:] = True
+        self.active = np.arange(self.population)
 
 
-    def move_pipes(self):
-
-        for i in range(len(self.bottom_pipe_list)):
-
-            self.bottom_pipe_list[i].centerx -= self.pipe_moving_freq
-            self.top_pipe_list[i].centerx -= self.pipe_moving_freq
-        
-        for i in range(len(self.pipe_list)):
-
-            self.pipe_list[i][0] -= self.pipe_moving_freq
+    def sample_action(self):
 
-        if self.pipe_list[0][0] <= self.bird_rects[0].centerx:
-            self.pipe_list.popleft()
-            return True
-        
-        return False
+        return self.random.choice([0, 1])
     
-    def reset(self):
+    def move_pipes(self):
 
-        self.bird_velocity = 0.
-        self.bottom_pipe_list.clear()
-        self.top_pipe_list.clear()
-        self.pipe_list.clear()
-        for bird_index in range(self.population):
-            self.bird_rects[bird_index].centery = self.start_bird_pos[1]
-        self.add_pipe()
+        with self.instrumentation.phase('simulate'):
+            ret = self.sim.move_pipes()
+            self.sim.add_pipe()
 
-        return self.get_observation()
+        self.instrumentation.count('frames')
 
+        return ret, len(self.active) > 0
 
-    def sample_action(self):
+    def draw(self, generation):
 
-        return random.choice([0, 1])
-    
-    def draw(self, generation, image_counter):
-
-        ret = self.move_pipes()
-        self.add_pipe()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    self.bird_velocity = self.jump_velocity
-            
-        self.screen.blit(self.bg_surface, (0, 0))
-        self.draw_birds()
-        self.draw_pipes()
-        self.draw_floor()
-
-        text = self.font.render(f"Generation : {generation}", True, (255, 255, 255))
-        text_rect = text.get_rect(center=(self.SIZE[0] * 0.5, self.SIZE[1] * 0.3))
-        self.screen.blit(text, text_rect)
+        ret, run = self.move_pipes()
 
-        pygame.display.update()
-        self.clock.tick(self.FRAME_RATE)
+        if self.render:
+            with self.instrumentation.phase('render'):
+                self.renderer.handle_events()
+                self.renderer.draw(self.sim, self.isAlive, f"Generation : {generation}")
 
-        pygame.image.save(self.screen, f"images/{image_counter}.png")
+                if self.recorder is not None:
+                    self.recorder.capture(self.renderer.screen)
     
-        return ret, any(self.isAlive)
+        return ret, run
 
 
     def step(self, action, bird_index):
 
 
         if action == 1:
-            self.bird_velocities[bird_index] = self.jump_velocity
+            self.sim.flap(bird_index)
         elif action == 0:
             pass
         else:
             raise ValueError(f"Got unexpected action - {action}")
-        
-        self.bird_velocities[bird_index] += self.GRAVITY
-        self.move_bird(bird_index)
+
+        if self.trace is not None:
+            self.trace.record(action)
+
+        self.sim.move_bird(bird_index)
             
 
-        is_collided, place_of_collision = self.check_collision(bird_index)
+        is_collided, place_of_collision = self.sim.check_collision(bird_index)
         if is_collided:
             self.isAlive[bird_index] = False
+            self.active = self.active[self.active != bird_index]
+            self.instrumentation.count('episodes')
+            self.instrumentation.count(f'collisions_{place_of_collision.lower()}')
 
         return is_collided
 
 
-def main(genomes, config):
+    def step_population(self, actions):
 
-    global generation, env, image_counter
-    generation += 1
-    env = FlappyBirdEnv(population=10)
+        # One action per active bird, returns which of them collided. Dead birds are
+        # compacted out of self.active.
+        actions = np.asarray(actions)
+        if not np.isin(actions, (0, 1)).all():
+            raise ValueError(f"Got unexpected action - {actions[~np.isin(actions, (0, 1))][0]}")
+
+        if self.trace is not None:
+            self.trace.record_many(actions)
+
+        with self.instrumentation.phase('simulate'):
+            self.sim.move_birds(self.active, actions == 1)
+
+            is_collided, place_of_collision = self.sim.check_collisions(self.active)
+            if is_collided.any():
+                self.isAlive[self.active[is_collided]] = False
+                self.active = self.active[~is_collided]
+
+        if self.instrumentation.enabled and is_collided.any():
+            self.instrumentation.count('episodes', int(is_collided.sum()))
+            for place, n in zip(*np.unique(place_of_collision[is_collided], return_counts=True)):
+                self.instrumentation.count(f'collisions_{COLLISION_PLACES[place].lower()}', int(n))
+
+        return is_collided
+
+
+def play_generation(genomes, config, generation, throttle=True, recorder=None, instrumentation=None, trace=None, seed=None,
+                    max_frames=None):
+
+    # Shows the whole population playing in one window. The game clock counts
+    # frames, so fitness does not depend on how fast the preview runs.
+    if trace is not None:
+        trace.info['generation'] = generation
+    # With a seed, birds start where evaluate_genomes puts them on the same course, and
+    # max_frames ends the generation like there.
+    env = FlappyBirdEnv(population=len(genomes), throttle=throttle, recorder=recorder, instrumentation=instrumentation, trace=trace)
+    if seed is not None:
+        env.reset([env.random_bird_y(random.Random(f"{seed}-{genome_id}")) for genome_id, _ in genomes], seed=seed)
+    if recorder is not None:
+        recorder.start_episode()
     
     score = 0
-    start_time = pygame.time.get_ticks()
+    frame = 0
 
     models_list = []
     genomes_list = []
@@ -248,15 +206,16 @@ def main(genomes, config):
     
     run = True
 
-    while run:
+    while run and (max_frames is None or frame < max_frames):
 
-        game_time = round((pygame.time.get_ticks() - start_time)/1000, 2)
-        ret, run = env.draw(generation, image_counter)
-        image_counter += 1
+        game_time = round(frame / env.FRAME_RATE, 2)
+        ret, run = env.draw(generation)
+        frame += 1
         for bird_index in range(env.population):
             if env.isAlive[bird_index]:
                 network_input = env.get_observation(bird_index)
-                output = models_list[bird_index].activate(network_input)
+                with env.instrumentation.phase('inference'):
+                    output = models_list[bird_index].activate(network_input)
 
                 action = 0 if output[0] > 0.5 else 1
                 is_collided = env.step(action, bird_index) 
@@ -264,25 +223,265 @@ def main(genomes, config):
                 genomes_list[bird_index].fitness = game_time + score - is_collided * 10
 
 
-def run_NEAT(config_filename):
+def main(genomes, config):
+
+    global generation
+    generation += 1
+    genomes = list(genomes)
+    play_generation(genomes, config, generation, instrumentation=instrumentation, trace=trace)
+
+    if instrumentation.enabled:
+        end_generation(instrumentation, generation, [genome.fitness for _, genome in genomes])
+
+
+def end_generation(instrumentation, generation, fitnesses):
+
+    # One instrumentation row per generation
+    instrumentation.end_episode(generation=generation, population=len(fitnesses),
+                                best_fitness=float(np.max(fitnesses)), mean_fitness=float(np.mean(fitnesses)))
+
+
+def evaluate_genomes(genomes, config, seed, max_frames, instrumentation=None, trace_path=None):
+
+    # Runs the genomes headless and as fast as possible on the pipe course of seed.
+    # Fitness follows main with the game clock in frames instead of wall time. With
+    # trace_path the run is appended to that trace file.
+    trace = None
+    if trace_path is not None:
+        trace = TraceWriter(trace_path)
+        trace.info['genome_ids'] = [genome_id for genome_id, _ in genomes]
+    env = FlappyBirdEnv(population=len(genomes), render=False, seed=seed, instrumentation=instrumentation,
+                        course_cache=course_cache, trace=trace)
+    env.reset([env.random_bird_y(random.Random(f"{seed}-{genome_id}")) for genome_id, _ in genomes], seed=seed)
+
+    # The whole population is activated and moved at once, the network is compacted
+    # to the birds still alive whenever one dies
+    network = PopulationNetwork.create([genome for _, genome in genomes], config)
+    fitnesses = np.zeros(len(genomes))
+
+    frame = 0
+    run = True
+
+    while run and frame < max_frames:
+
+        game_time = frame / env.FRAME_RATE
+        ret, run = env.move_pipes()
+        frame += 1
+
+        active = env.active
+        with env.instrumentation.phase('inference'):
+            outputs = network.activate(env.get_observations())
+            actions = np.where(outputs[:, 0] > 0.5, 0, 1)
+
+        is_collided = env.step_population(actions)
+
+        fitnesses[active] = game_time - is_collided * 10
+
+        if is_collided.any():
+            with env.instrumentation.phase('inference'):
+                network = network.subset(~is_collided)
+
+    if trace is not None:
+        trace.close()
+
+    return fitnesses.tolist()
+
+
+class HeadlessEvaluator:
+
+    # Splits every generation across a process pool, like neat.ParallelEvaluator but
+    # evaluating whole chunks of genomes per task. All workers of a generation share
+    # one seed, so they see the same pipes and fitnesses are comparable. With
+    # render_every, every render_every-th generation is also shown playing its course in a
+    # window at frame_rate, its fitnesses still come from the headless run.
+    # Phases are only timed inside the workers when there is no pool, with one the
+    # instrumentation sees the whole generation as 'simulate'. With trace_path every
+    # chunk of every generation is appended to that episode_trace file.
+
+    def __init__(self, num_workers, seed=0, max_frames=None, render_every=None, instrumentation=None, trace_path=None):
+
+        self.num_workers = num_workers
+        self.seed = seed
+        self.max_frames = max_frames
+        self.render_every = render_every
+        self.instrumentation = NULL_INSTRUMENTATION if instrumentation is None else instrumentation
+        self.trace_path = trace_path
+        self.generation = 0
+        self.pool = multiprocessing.Pool(num_workers) if num_workers > 1 else None
+
+
+    def close(self):
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+    def evaluate(self, genomes, config):
+
+        seed = self.seed + self.generation
+        self.generation += 1
+
+        genomes = list(genomes)
+
+        if self.render_every is not None and self.generation % self.render_every == 0:
+            play_generation(genomes, config, self.generation, instrumentation=self.instrumentation, seed=seed,
+                            max_frames=self.frame_cap(config))
+        self.evaluate_headless(genomes, config, seed)
+
+        if self.instrumentation.enabled:
+            end_generation(self.instrumentation, self.generation, [genome.fitness for _, genome in genomes])
+
+
+    def frame_cap(self, config):
+
+        # Runs stop once a bird reaches fitness_threshold unless told otherwise
+        if self.max_frames is None:
+            return int(config.fitness_threshold * 60) + 1
+
+        return self.max_frames
+
+
+    def evaluate_headless(self, genomes, config, seed):
+
+        max_frames = self.frame_cap(config)
+
+        if self.pool is None:
+            chunks = [genomes]
+            results = [evaluate_genomes(genomes, config, seed, max_frames, self.instrumentation, self.trace_path)]
+        else:
+            chunk_size = -(-len(genomes) // self.num_workers)
+            chunks = [genomes[i:i + chunk_size] for i in range(0, len(genomes), chunk_size)]
+            with self.instrumentation.phase('simulate'):
+                results = self.pool.starmap(evaluate_genomes, [(chunk, config, seed, max_frames, None, self.trace_path) for chunk in chunks])
+
+        for chunk, fitnesses in zip(chunks, results):
+            for (_, genome), fitness in zip(chunk, fitnesses):
+                genome.fitness = fitness
+
+
+class NEATCheckpointer(neat.Checkpointer):
+
+    # neat.Checkpointer writing every checkpoint atomically, an interrupted save never
+    # leaves a truncated file behind to be resumed from
+
+    def save_checkpoint(self, config, population, species_set, generation):
+
+        filename = f'{self.filename_prefix}{generation}'
+        print(f"Saving checkpoint to {filename}")
+
+        def write(f):
+            with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=5) as gz:
+                data = (generation, config, population, species_set, random.getstate())
+                pickle.dump(data, gz, protocol=pickle.HIGHEST_PROTOCOL)
+
+        atomic_write(filename, write)
+
+
+def latest_checkpoint(filename_prefix):
+
+    # Newest checkpoint written with filename_prefix, None if there is none
+    directory, prefix = os.path.split(filename_prefix)
+    directory = directory or '.'
+    pattern = re.compile(re.escape(prefix) + r'(\d+)$')
+
+    if not os.path.isdir(directory):
+        return None
+
+    found = []
+    for filename in os.listdir(directory):
+        match = pattern.match(filename)
+        if match:
+            found.append((int(match.group(1)), filename))
+
+    if not found:
+        return None
+
+    return os.path.join(directory, max(found)[1])
+
+
+def run_NEAT(config_filename, num_workers=0, generations=15, seed=0, render_every=None,
+             checkpoint_every=None, checkpoint_prefix='checkpoints/neat-checkpoint-', resume=False, instrumentation=None,
+             winner_filename=None, trace_path=None, broker=None):
+
+    # num_workers=0 watches the population play in a pygame window, any other
+    # value trains headless with that many worker processes. checkpoint_every saves
+    # the population every that many generations, resume continues from the newest
+    # checkpoint with checkpoint_prefix (or from the file resume names). instrumentation
+    # gets one row per generation. The best genome is pickled to winner_filename, ready
+    # for evaluate.py and policy_server.py. With trace_path every generation is appended
+    # to that episode_trace file, ready to be replayed with episode_trace.py. With a
+    # distributed_neat broker, generations are evaluated by its workers instead.
+    global generation, trace
+    set_instrumentation(instrumentation)
 
     config = neat.config.Config(neat.DefaultGenome, 
                                 neat.DefaultReproduction,
                                 neat.DefaultSpeciesSet, 
                                 neat.DefaultStagnation,
                                 config_filename)
-    
-    neat_pop = neat.population.Population(config)
+
+    checkpoint = resume if isinstance(resume, str) else (latest_checkpoint(checkpoint_prefix) if resume else None)
+    if checkpoint is None:
+        neat_pop = neat.population.Population(config)
+    else:
+        # The checkpoint of generation g holds the population bred for generation g + 1
+        neat_pop = NEATCheckpointer.restore_checkpoint(checkpoint)
+        neat_pop.generation += 1
+        generation = neat_pop.generation
     
     neat_pop.add_reporter(neat.StdOutReporter(True))
     stats = neat.StatisticsReporter()
     neat_pop.add_reporter(stats)
+
+    if checkpoint_every is not None:
+        os.makedirs(os.path.dirname(checkpoint_prefix) or '.', exist_ok=True)
+        neat_pop.add_reporter(NEATCheckpointer(checkpoint_every, None, checkpoint_prefix))
     
-    neat_pop.run(main, 15)
+    if num_workers == 0 and broker is None:
+        trace = None if trace_path is None else TraceWriter(trace_path)
+        try:
+            winner = neat_pop.run(main, generations)
+        finally:
+            if trace is not None:
+                trace.close()
+                trace = None
+    else:
+        if broker is None:
+            evaluator = HeadlessEvaluator(num_workers, seed, render_every=render_every, instrumentation=instrumentation,
+                                          trace_path=trace_path)
+        else:
+            from distributed_neat import DistributedEvaluator
+            evaluator = DistributedEvaluator(broker, seed=seed, instrumentation=instrumentation)
+        # Resumed runs keep the per-generation pipe seeds of the original run
+        evaluator.generation = neat_pop.generation
+        try:
+            winner = neat_pop.run(evaluator.evaluate, generations)
+        finally:
+            evaluator.close()
+
+    if winner_filename is not None:
+        atomic_write(winner_filename, lambda f: pickle.dump(winner, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    return winner
     
+
+def set_instrumentation(new_instrumentation=None):
+
+    # Instrumentation used by main, which neat calls with genomes and config only
+    global instrumentation
+    instrumentation = NULL_INSTRUMENTATION if new_instrumentation is None else new_instrumentation
+
+
 global generation
-global image_counter
 generation = 0
-image_counter = 0
+instrumentation = NULL_INSTRUMENTATION
+trace = None
+
+# With FLAPPY_COURSE_DIR set, every worker evaluating a generation maps the same course
+# file instead of drawing it
+course_cache = shared_cache()
 
-run_NEAT('config_file.txt')
\ No newline at end of file
+if __name__ == '__main__':
+    run_NEAT('config_file.txt')
@@ -0,0 +1,300 @@
+import os
+import queue
+import sys
+import threading
+import numpy as np
+import pygame
+
+
+# Bird sprites are pre-rotated every ANGLE_STEP degrees between MIN_ANGLE and MAX_ANGLE,
+# the range -velocity * 5 covers from a jump to a fall across the whole screen
+ANGLE_STEP = 2
+MIN_ANGLE = -90
+MAX_ANGLE = 30
+FLAP_FRAMES = ('downflap', 'midflap', 'upflap')
+FLAP_PERIOD = 5
+
+
+class Renderer:
+
+    # Optional pygame view of a flappy_sim.FlappySim, only created when an environment renders.
+    # Envs import this module when they first render, so headless runs never import pygame.
+    # With throttle the preview is slowed down to frame_rate, otherwise it runs as fast as
+    # the simulation does. Rotated birds and the flipped pipe come from a sprite atlas built
+    # once, so drawing is blits only, and only the regions that changed are pushed to the display.
+
+    def __init__(self, size=(400, 600), frame_rate=60, throttle=True):
+
+        self.SIZE = size
+        self.FRAME_RATE = frame_rate
+        self.throttle = throttle
+        self.GROUNDY = int(0.85 * self.SIZE[1])
+
+        pygame.init()
+        self.screen = pygame.display.set_mode(self.SIZE)
+        self.clock = pygame.time.Clock()
+
+        # Background Surface
+        self.bg_surface = pygame.image.load('assets/background-day.png').convert()
+        self.bg_surface = pygame.transform.scale(self.bg_surface, self.SIZE)
+
+        # Floor surface
+        self.floor_surface = pygame.image.load('assets/base.png').convert()
+        self.floor_surface = pygame.transform.scale(self.floor_surface, (self.SIZE[0], self.floor_surface.get_height()))
+        self.floor_x_pos = 0
+
+        # Bird sprites, bird_sprites[flap frame][angle index]
+        self.bird_sprites = []
+        for flap in FLAP_FRAMES:
+            bird_surface = pygame.image.load(f'assets/bluebird-{flap}.png').convert_alpha()
+            self.bird_sprites.append([pygame.transform.rotozoom(bird_surface, angle, 1)
+                                      for angle in range(MIN_ANGLE, MAX_ANGLE + 1, ANGLE_STEP)])
+        self.frames_drawn = 0
+
+        # Pipes
+        self.pipe_surface = pygame.image.load('assets/pipe-green.png').convert()
+        self.flip_pipe_surface = pygame.transform.flip(self.pipe_surface, False, True)
+
+        # Font
+        self.font = pygame.font.Font('freesansbold.ttf', 16)
+        self.text = None
+        self.text_surface = None
+
+        # Screen regions drawn on the previous frame, None until the first full frame
+        self.drawn_rects = None
+
+
+    def handle_events(self):
+
+        # Returns True when the player asked the bird to jump
+        jump = False
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_UP:
+                    jump = True
+
+        return jump
+
+
+    def bird_sprite(self, velocity):
+
+        angle = min(max(- velocity * 5, MIN_ANGLE), MAX_ANGLE)
+        flap = (self.frames_drawn // FLAP_PERIOD) % len(FLAP_FRAMES)
+
+        return self.bird_sprites[flap][int(round((angle - MIN_ANGLE) / ANGLE_STEP))]
+
+
+    def draw_floor(self):
+
+        drawn = [self.screen.blit(self.floor_surface, (self.floor_x_pos, self.GROUNDY)),
+                 self.screen.blit(self.floor_surface, (self.floor_x_pos + self.SIZE[0], self.GROUNDY))]
+
+        self.floor_x_pos -= 1
+        if self.floor_x_pos <= -self.SIZE[0]:
+            self.floor_x_pos = 0
+
+        return drawn
+
+
+    def draw_birds(self, sim, alive=None):
+
+        drawn = []
+        for bird_index in range(sim.num_birds):
+            if alive is None or alive[bird_index]:
+                rotated_bird = self.bird_sprite(sim.bird_velocity(bird_index))
+                drawn.append(self.screen.blit(rotated_bird, sim.bird_rect(bird_index)[:2]))
+
+        return drawn
+
+
+    def draw_pipes(self, sim):
+
+        drawn = []
+        for bottom_pipe, top_pipe in sim.pipe_rects():
+
+            drawn.append(self.screen.blit(self.pipe_surface, bottom_pipe[:2]))
+            drawn.append(self.screen.blit(self.flip_pipe_surface, top_pipe[:2]))
+
+        return drawn
+
+
+    def draw_text(self, text):
+
+        if text != self.text:
+            self.text = text
+            self.text_surface = self.font.render(text, True, (255, 255, 255))
+
+        text_rect = self.text_surface.get_rect(center=(self.SIZE[0] * 0.5, self.SIZE[1] * 0.3))
+
+        return [self.screen.blit(self.text_surface, text_rect)]
+
+
+    def draw(self, sim, alive=None, text=None):
+
+        # Erase what the previous frame drew, then draw the new frame on top
+        if self.drawn_rects is None:
+            self.screen.blit(self.bg_surface, (0, 0))
+        else:
+            for rect in self.drawn_rects:
+                self.screen.blit(self.bg_surface, rect, rect)
+
+        drawn = self.draw_birds(sim, alive)
+        drawn += self.draw_pipes(sim)
+        drawn += self.draw_floor()
+        if text is not None:
+            drawn += self.draw_text(text)
+
+        if self.drawn_rects is None:
+            pygame.display.update()
+        else:
+            pygame.display.update(self.drawn_rects + drawn)
+
+        self.drawn_rects = drawn
+        self.frames_drawn += 1
+
+        if self.throttle:
+            self.clock.tick(self.FRAME_RATE)
+
+
+class FrameRecorder:
+
+    # Opt-in dump of every rendered frame as images/<counter>.png, synchronously
+
+    def __init__(self, directory='images'):
+
+        self.directory = directory
+        self.image_counter = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+
+    def start_episode(self):
+        # One running counter over all episodes
+        pass
+
+
+    def capture(self, screen):
+
+        pygame.image.save(screen, os.path.join(self.directory, f"{self.image_counter}.png"))
+        self.image_counter += 1
+
+
+    def close(self):
+        pass
+
+
+class AsyncRecorder:
+
+    # Streams rendered frames straight into one animated GIF or video per episode (or NEAT
+    # generation). capture only copies the screen into one of num_buffers reusable pixel
+    # buffers; a background thread encodes them with imageio. When every buffer is waiting
+    # to be encoded, policy 'drop' skips the frame and 'block' waits for the encoder.
+    # Once the encoder has failed, e.g. writing mp4 without ffmpeg, capture and close
+    # raise its error instead of waiting for it.
+
+    def __init__(self, path='images/episode_{episode}.gif', fps=60, num_buffers=64, policy='drop'):
+
+        if policy not in ('drop', 'block'):
+            raise ValueError(f"Got unexpected policy - {policy}")
+
+        self.path = path
+        self.fps = fps
+        self.num_buffers = num_buffers
+        self.policy = policy
+        self.episode = -1
+        self.dropped_frames = 0
+
+        self.buffers = None
+        self.free_buffers = queue.Queue()
+        self.frames = queue.Queue()
+        self.error = None
+
+        self.thread = threading.Thread(target=self.encode, daemon=True)
+        self.thread.start()
+
+
+    def start_episode(self):
+
+        self.episode += 1
+        path = self.path.format(episode=self.episode)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.frames.put(('episode', path))
+
+
+    def capture(self, screen):
+
+        if self.buffers is None:
+            # Buffers are laid out like pygame.surfarray, (width, height, 3)
+            self.buffers = [np.empty(screen.get_size() + (3,), dtype=np.uint8) for _ in range(self.num_buffers)]
+            for index in range(self.num_buffers):
+                self.free_buffers.put(index)
+        if self.episode < 0:
+            self.start_episode()
+
+        self.check()
+        while True:
+            try:
+                index = self.free_buffers.get(block=self.policy == 'block', timeout=0.1)
+                break
+            except queue.Empty:
+                if self.policy == 'drop':
+                    self.dropped_frames += 1
+                    return
+                self.check()
+
+        pygame.pixelcopy.surface_to_array(self.buffers[index], screen)
+        self.frames.put(('frame', index))
+
+
+    def check(self):
+
+        if self.error is not None:
+            raise RuntimeError(f"Frame encoder failed - {self.error!r}") from self.error
+        if not self.thread.is_alive():
+            raise RuntimeError("Frame encoder is not running")
+
+
+    def encode(self):
+
+        try:
+            self.encode_frames()
+        except BaseException as error:
+            self.error = error
+
+
+    def encode_frames(self):
+
+        import imageio
+
+        writer = None
+        path = None
+        while True:
+            kind, value = self.frames.get()
+
+            if kind == 'frame':
+                # Files are opened on their first frame, so episodes without frames leave none
+                if writer is None and path is not None:
+                    writer = imageio.get_writer(path, mode='I', fps=self.fps)
+                if writer is not None:
+                    writer.append_data(self.buffers[value].transpose(1, 0, 2))
+                self.free_buffers.put(value)
+                continue
+
+            if writer is not None:
+                writer.close()
+                writer = None
+
+            if kind == 'close':
+                return
+            path = value
+
+
+    def close(self):
+
+        # Waits until every captured frame is encoded and the last file is written
+        self.frames.put(('close', None))
+        self.thread.join()
+        if self.error is not None:
+            self.check()
@@ -0,0 +1,234 @@
+import random
+from collections import deque
+
+# Sprite sizes of assets/bluebird-midflap.png and assets/pipe-green.png, hard-coded
+# so that the simulation never has to import pygame or decode the images
+BIRD_SIZE = (34, 24)
+PIPE_SIZE = (52, 320)
+MAX_PIPES = 4
+
+# Place of collision codes of the batched simulators, COLLISION_PLACES[code] is the
+# name FlappySim.check_collision returns
+NO_COLLISION, PIPE, TOP, BOTTOM = 0, 1, 2, 3
+COLLISION_PLACES = (None, 'PIPE', 'TOP', 'BOTTOM')
+
+# Physics modes. 'float' is the original game, 'fixed' keeps velocities as integers in
+# 1/2**FRACTION_BITS px per frame. Bird positions are whole pixels in both and move by
+# the velocity truncated toward zero, so the modes agree whenever gravity and jump
+# velocity are exact in fixed point, see fixed_point.py.
+PHYSICS = ('float', 'fixed')
+FRACTION_BITS = 8
+
+
+def to_fixed(value):
+
+    # value in px or px per frame as an integer number of 1/2**FRACTION_BITS px
+    scaled = value * (1 << FRACTION_BITS)
+    if scaled != int(scaled):
+        raise ValueError(f"Got value not representable in fixed point - {value}")
+
+    return int(scaled)
+
+
+def seed_env(sim, seed, stream, traced=False):
+
+    # Seeds sim and returns the env's own generator of stream. Every env owns its
+    # generators, runs with the same seed replay bit-for-bit. Traces replay the pipes
+    # from the seed, so a traced env always gets one.
+    if seed is None and traced:
+        seed = random.SystemRandom().getrandbits(32)
+
+    sim.seed(seed)
+    return random.Random(None if seed is None else f"{seed}-{stream}")
+
+
+def fixed_move(y, velocity):
+
+    # Whole pixel y moved by a fixed point velocity, truncated toward zero like int()
+    position = (y << FRACTION_BITS) + velocity
+    return position >> FRACTION_BITS if position >= 0 else -(-position >> FRACTION_BITS)
+
+
+class FlappySim:
+
+    # Headless game world shared by the A2C and the NEAT environments. Geometry follows
+    # pygame.Rect: integer positions, birds are stored by their centery and pipes by their
+    # centerx and the top of the bottom pipe. Rendering is done by flappy_render.Renderer.
+
+    def __init__(self, size=(400, 600), gravity=0.25, jump_velocity=-3, num_birds=1, seed=None, course_cache=None, physics='float'):
+
+        if physics not in PHYSICS:
+            raise ValueError(f"Got unexpected physics - {physics}")
+
+        self.SIZE = size
+        self.GRAVITY = gravity
+        self.jump_velocity = jump_velocity
+        self.physics = physics
+        self.zero_velocity = 0. if physics == 'float' else 0
+        if physics == 'fixed':
+            self.gravity_fixed = to_fixed(gravity)
+            self.jump_fixed = to_fixed(jump_velocity)
+            self.flap = self.flap_fixed
+            self.move_bird = self.move_bird_fixed
+        self.TB_PIPE_GAP = int(0.25 * self.SIZE[1])
+        self.SS_PIPE_GAP = self.SIZE[0] // 2
+        self.GROUNDY = int(0.85 * self.SIZE[1])
+
+        self.pipe_moving_freq = 3
+        self.pipe_spawn_x = int(self.SIZE[0] + PIPE_SIZE[0] // 2)
+        self.pipe_pos_range = (int(0.4 * self.SIZE[1]), int(0.75 * self.SIZE[1]))
+
+        self.course_cache = course_cache
+        self.seed(seed)
+
+        # [centerx, top of bottom pipe] of the pipes on screen
+        self.pipes = deque(maxlen=MAX_PIPES)
+        # [centerx, centery of the gap] of the pipes the birds have not passed yet
+        self.pipe_list = deque(maxlen=MAX_PIPES)
+
+        self.num_birds = num_birds
+        self.start_bird_pos = [int(0.2 * self.SIZE[0]), int(0.425 * self.SIZE[1])]
+        self.bird_left = self.start_bird_pos[0] - BIRD_SIZE[0] // 2
+        self.bird_ys = [self.start_bird_pos[1] for _ in range(num_birds)]
+        self.bird_velocities = [self.zero_velocity for _ in range(num_birds)]
+
+        self.add_pipe()
+
+
+    def seed(self, seed=None):
+
+        # Pipe heights and observation noise have their own streams, so every world seeded
+        # alike sees the same course however often its birds are observed
+        self.pipe_random = random.Random(None if seed is None else f"{seed}-pipes")
+        self.noise_random = random.Random(None if seed is None else f"{seed}-noise")
+
+        # With a pipe_course.PipeCourseCache, seeded pipe heights are read from the cached
+        # course of the seed. pipe_index counts the pipes of every episode since seeding.
+        self.course_seed = seed
+        self.pipe_index = 0
+        self.course = None
+        if self.course_cache is not None and seed is not None:
+            self.course = self.course_cache.get('python', seed, pipe_pos_range=self.pipe_pos_range)
+
+
+    def add_pipe(self):
+
+        if (not self.pipes) or (self.pipe_spawn_x - self.pipes[-1][0] >= self.SS_PIPE_GAP):
+
+            if self.course is None:
+                random_pipe_pos = self.pipe_random.randint(*self.pipe_pos_range)
+            else:
+                random_pipe_pos = int(self.course[self.pipe_index])
+                if self.pipe_index + 1 == len(self.course):
+                    # Past its course a world continues with the live generator of the same stream
+                    from pipe_course import python_random
+                    self.pipe_random = python_random(self.course_seed, self.pipe_pos_range, len(self.course))
+                    self.course = None
+            self.pipe_index += 1
+
+            self.pipes.append([self.pipe_spawn_x, random_pipe_pos])
+            self.pipe_list.append([self.pipe_spawn_x, random_pipe_pos - (self.TB_PIPE_GAP // 2)])
+
+
+    def bird_rect(self, bird_index):
+
+        # (left, top, width, height) of the bird
+        return (self.bird_left, self.bird_ys[bird_index] - BIRD_SIZE[1] // 2) + BIRD_SIZE
+
+
+    def pipe_rects(self):
+
+        # (left, top, width, height) of the bottom and the top pipe of every pipe on screen
+        for centerx, pipe_pos in self.pipes:
+            left = centerx - PIPE_SIZE[0] // 2
+            yield (left, pipe_pos) + PIPE_SIZE, (left, pipe_pos - self.TB_PIPE_GAP - PIPE_SIZE[1]) + PIPE_SIZE
+
+
+    def check_collision(self, bird_index):
+
+        bird_top = self.bird_ys[bird_index] - BIRD_SIZE[1] // 2
+        bird_bottom = bird_top + BIRD_SIZE[1]
+        bird_right = self.bird_left + BIRD_SIZE[0]
+
+        # Strict overlap test, same as pygame.Rect.colliderect
+        for centerx, pipe_pos in self.pipes:
+            pipe_left = centerx - PIPE_SIZE[0] // 2
+            if self.bird_left < pipe_left + PIPE_SIZE[0] and bird_right > pipe_left:
+                if bird_top < pipe_pos + PIPE_SIZE[1] and bird_bottom > pipe_pos:
+                    return True, 'PIPE'
+                top_pipe_bottom = pipe_pos - self.TB_PIPE_GAP
+                if bird_top < top_pipe_bottom and bird_bottom > top_pipe_bottom - PIPE_SIZE[1]:
+                    return True, 'PIPE'
+
+        if bird_top <= 0:
+            return True, 'TOP'
+
+        if bird_bottom >= self.GROUNDY:
+            return True, 'BOTTOM'
+
+        return False, None
+
+
+    def get_observation(self, bird_index):
+
+        observation = [
+            self.bird_ys[bird_index] - self.pipe_list[0][1] + self.noise_random.random(),
+            self.pipe_list[0][0] - self.start_bird_pos[0] + self.noise_random.random()]
+
+        return observation
+
+
+    def bird_velocity(self, bird_index):
+
+        # In px per frame whatever the physics
+        velocity = self.bird_velocities[bird_index]
+        return velocity if self.physics == 'float' else velocity / (1 << FRACTION_BITS)
+
+
+    def flap(self, bird_index):
+        self.bird_velocities[bird_index] = self.jump_velocity
+
+
+    def move_bird(self, bird_index):
+
+        # Rect attributes are integers, pygame truncates the float position
+        self.bird_velocities[bird_index] += self.GRAVITY
+        self.bird_ys[bird_index] = int(self.bird_ys[bird_index] + self.bird_velocities[bird_index])
+
+
+    def flap_fixed(self, bird_index):
+        self.bird_velocities[bird_index] = self.jump_fixed
+
+
+    def move_bird_fixed(self, bird_index):
+
+        self.bird_velocities[bird_index] += self.gravity_fixed
+        self.bird_ys[bird_index] = fixed_move(self.bird_ys[bird_index], self.bird_velocities[bird_index])
+
+
+    def move_pipes(self):
+
+        for pipe in self.pipes:
+            pipe[0] -= self.pipe_moving_freq
+
+        for pipe in self.pipe_list:
+            pipe[0] -= self.pipe_moving_freq
+
+        if self.pipe_list[0][0] <= self.start_bird_pos[0]:
+            self.pipe_list.popleft()
+            return True
+
+        return False
+
+
+    def reset(self, bird_ys=None, seed=None):
+
+        if seed is not None:
+            self.seed(seed)
+
+        self.pipes.clear()
+        self.pipe_list.clear()
+        for bird_index in range(self.num_birds):
+            self.bird_ys[bird_index] = self.start_bird_pos[1] if bird_ys is None else bird_ys[bird_index]
+            self.bird_velocities[bird_index] = self.zero_velocity
+        self.add_pipe()
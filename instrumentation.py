@@ -0,0 +1,210 @@
+import cProfile
+import csv
+import json
+import time
+
+# Optional timing and counters for the envs and trainers. Every hook defaults to
+# NULL_INSTRUMENTATION, whose methods do nothing, so a run without instrumentation pays
+# one no-op call per hook.
+#
+#   instrumentation = Instrumentation(JSONLWriter('metrics.jsonl'), profile_episodes=20)
+#   env = FlappyBirdEnv(instrumentation=instrumentation)
+#   actor_critic.instrumentation = instrumentation
+#
+# One row is written per episode (per generation for NEAT) with the seconds spent in
+# every phase, the counters and the values the trainer reports, e.g. reward and losses.
+# There is no separate optimizer phase: ActorCritic.train_step computes the gradients and
+# applies both optimizer updates in one compiled call, so 'gradient' includes them.
+
+PHASES = ('simulate', 'render', 'inference', 'gradient')
+COUNTERS = ('frames', 'episodes', 'collisions_pipe', 'collisions_top', 'collisions_bottom')
+
+
+class NullPhase:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+class NullInstrumentation:
+
+    enabled = False
+
+    def phase(self, name):
+        return NULL_PHASE
+
+    def count(self, name, n=1):
+        pass
+
+    def end_episode(self, **values):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
+class Phase:
+
+    # Times are exclusive: entering a phase inside another one pauses the outer phase
+
+    def __init__(self, instrumentation, name):
+
+        self.instrumentation = instrumentation
+        self.name = name
+        self.start = 0.
+        self.outer = None
+
+
+    def __enter__(self):
+
+        now = time.perf_counter()
+        instrumentation = self.instrumentation
+        self.outer = instrumentation.current
+        if self.outer is not None:
+            instrumentation.times[self.outer.name] += now - self.outer.start
+
+        instrumentation.current = self
+        self.start = now
+        return self
+
+
+    def __exit__(self, *exc_info):
+
+        now = time.perf_counter()
+        instrumentation = self.instrumentation
+        instrumentation.times[self.name] += now - self.start
+
+        instrumentation.current = self.outer
+        if self.outer is not None:
+            self.outer.start = now
+        return False
+
+
+class Instrumentation:
+
+    # Collects phase times and counters until end_episode turns them into one row. With
+    # profile_episodes, the first that many episodes also run under cProfile and the
+    # stats are dumped to profile_path (readable with python -m pstats or snakeviz).
+
+    enabled = True
+
+    def __init__(self, writer=None, profile_episodes=0, profile_path='profile.prof'):
+
+        self.writer = writer
+        self.times = dict.fromkeys(PHASES, 0.)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.phases = {}
+        self.current = None
+        self.episode = 0
+        self.episode_start = time.perf_counter()
+
+        self.profile_episodes = profile_episodes
+        self.profile_path = profile_path
+        self.profiler = None
+        if profile_episodes > 0:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+
+    def phase(self, name):
+
+        phase = self.phases.get(name)
+        if phase is None:
+            self.times.setdefault(name, 0.)
+            phase = self.phases[name] = Phase(self, name)
+
+        return phase
+
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+
+    def end_episode(self, **values):
+
+        now = time.perf_counter()
+        row = {'episode': self.episode, 'wall_s': now - self.episode_start}
+        row.update((f'{name}_s', seconds) for name, seconds in self.times.items())
+        row.update(self.counters)
+        row.update(values)
+
+        if self.writer is not None:
+            self.writer.write(row)
+
+        for name in self.times:
+            self.times[name] = 0.
+        for name in self.counters:
+            self.counters[name] = 0
+        self.episode += 1
+        self.episode_start = now
+
+        if self.profiler is not None and self.episode >= self.profile_episodes:
+            self.stop_profile()
+
+        return row
+
+
+    def stop_profile(self):
+
+        self.profiler.disable()
+        self.profiler.dump_stats(self.profile_path)
+        self.profiler = None
+
+
+    def close(self):
+
+        if self.profiler is not None:
+            self.stop_profile()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class JSONLWriter:
+
+    def __init__(self, path):
+
+        self.file = open(path, 'a')
+
+
+    def write(self, row):
+
+        self.file.write(json.dumps(row) + '\n')
+        self.file.flush()
+
+
+    def close(self):
+        self.file.close()
+
+
+class CSVWriter:
+
+    # Columns are those of the first row, later keys are dropped
+
+    def __init__(self, path):
+
+        self.file = open(path, 'a', newline='')
+        self.writer = None
+
+
+    def write(self, row):
+
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, list(row), extrasaction='ignore')
+            if self.file.tell() == 0:
+                self.writer.writeheader()
+
+        self.writer.writerow(row)
+        self.file.flush()
+
+
+    def close(self):
+        self.file.close()
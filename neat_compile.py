@@ -0,0 +1,220 @@
+import numpy as np
+from neat.graphs import feed_forward_layers
+
+# NumPy versions of neat.activations, with the same clamping
+
+
+def sigmoid_activation(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(5.0 * z, -60.0, 60.0)))
+
+
+def tanh_activation(z):
+    return np.tanh(np.clip(2.5 * z, -60.0, 60.0))
+
+
+def sin_activation(z):
+    return np.sin(np.clip(5.0 * z, -60.0, 60.0))
+
+
+def gauss_activation(z):
+    return np.exp(-5.0 * np.clip(z, -3.4, 3.4) ** 2)
+
+
+def relu_activation(z):
+    return np.where(z > 0.0, z, 0.0)
+
+
+def softplus_activation(z):
+    return 0.2 * np.log(1 + np.exp(np.clip(5.0 * z, -60.0, 60.0)))
+
+
+def identity_activation(z):
+    return z
+
+
+def clamped_activation(z):
+    return np.clip(z, -1.0, 1.0)
+
+
+def exp_activation(z):
+    return np.exp(np.clip(z, -60.0, 60.0))
+
+
+def abs_activation(z):
+    return np.abs(z)
+
+
+def hat_activation(z):
+    return np.maximum(0.0, 1 - np.abs(z))
+
+
+def square_activation(z):
+    return z ** 2
+
+
+def cube_activation(z):
+    return z ** 3
+
+
+ACTIVATIONS = {
+    'sigmoid': sigmoid_activation,
+    'tanh': tanh_activation,
+    'sin': sin_activation,
+    'gauss': gauss_activation,
+    'relu': relu_activation,
+    'softplus': softplus_activation,
+    'identity': identity_activation,
+    'clamped': clamped_activation,
+    'exp': exp_activation,
+    'abs': abs_activation,
+    'hat': hat_activation,
+    'square': square_activation,
+    'cube': cube_activation,
+}
+ACTIVATION_NAMES = list(ACTIVATIONS)
+
+
+class PopulationNetwork:
+
+    # All feed forward networks of a generation compiled into padded arrays. Nodes are
+    # grouped by their layer depth, so one activate call costs a few NumPy operations per
+    # depth instead of a Python loop over every node of every genome. Results match
+    # neat.nn.FeedForwardNetwork.activate within float tolerance.
+
+    def __init__(self, num_inputs, num_outputs, num_slots, layers):
+
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+        # Every genome keeps its node values in num_slots columns, inputs first, then outputs,
+        # the last column swallows the writes of padding nodes
+        self.num_slots = num_slots
+        # One (slots, sources, weights, biases, responses, activations) tuple per depth
+        self.layers = layers
+
+        # Activation functions present at every depth with the nodes they apply to
+        self.activation_groups = []
+        for layer in layers:
+            codes = np.unique(layer[5])
+            if len(codes) == 0:
+                self.activation_groups.append([(identity_activation, None)])
+            elif len(codes) == 1:
+                self.activation_groups.append([(ACTIVATIONS[ACTIVATION_NAMES[codes[0]]], None)])
+            else:
+                self.activation_groups.append([(ACTIVATIONS[ACTIVATION_NAMES[code]], layer[5] == code) for code in codes])
+
+
+    @staticmethod
+    def create(genomes, config):
+
+        input_keys = config.genome_config.input_keys
+        output_keys = config.genome_config.output_keys
+        num_genomes = len(genomes)
+
+        genome_layers = []
+        genome_slots = []
+        for genome in genomes:
+            connections = [cg.key for cg in genome.connections.values() if cg.enabled]
+            layers = feed_forward_layers(input_keys, output_keys, connections)
+
+            slots = {key: i for i, key in enumerate(list(input_keys) + list(output_keys))}
+            depth_nodes = []
+            for layer in layers:
+                nodes = []
+                for node in sorted(layer):
+                    slots.setdefault(node, len(slots))
+                    ng = genome.nodes[node]
+                    if ng.aggregation != 'sum':
+                        raise ValueError(f"Unsupported aggregation - {ng.aggregation}")
+                    if ng.activation not in ACTIVATIONS:
+                        raise ValueError(f"Unsupported activation - {ng.activation}")
+                    links = [(i, genome.connections[(i, o)].weight) for (i, o) in connections if o == node]
+                    nodes.append((node, ng.bias, ng.response, ACTIVATION_NAMES.index(ng.activation), links))
+                depth_nodes.append(nodes)
+
+            genome_layers.append(depth_nodes)
+            genome_slots.append(slots)
+
+        num_slots = max((len(slots) for slots in genome_slots), default=len(input_keys) + len(output_keys)) + 1
+        depth = max((len(layers) for layers in genome_layers), default=0)
+
+        layers = []
+        for d in range(depth):
+            width = max(len(layers[d]) if d < len(layers) else 0 for layers in genome_layers)
+            fan_in = max((len(node[4]) for layers in genome_layers if d < len(layers) for node in layers[d]), default=0)
+
+            slots = np.full((num_genomes, width), num_slots - 1, dtype=np.int64)
+            sources = np.full((num_genomes, width, fan_in), num_slots - 1, dtype=np.int64)
+            weights = np.zeros((num_genomes, width, fan_in))
+            biases = np.zeros((num_genomes, width))
+            responses = np.zeros((num_genomes, width))
+            activations = np.zeros((num_genomes, width), dtype=np.int64)
+
+            for g, (depth_nodes, genome_slot) in enumerate(zip(genome_layers, genome_slots)):
+                if d >= len(depth_nodes):
+                    continue
+                for k, (node, bias, response, activation, links) in enumerate(depth_nodes[d]):
+                    slots[g, k] = genome_slot[node]
+                    biases[g, k] = bias
+                    responses[g, k] = response
+                    activations[g, k] = activation
+                    for l, (i, w) in enumerate(links):
+                        sources[g, k, l] = genome_slot[i]
+                        weights[g, k, l] = w
+
+            layers.append((slots, sources, weights, biases, responses, activations))
+
+        return PopulationNetwork(len(input_keys), len(output_keys), num_slots, layers)
+
+
+    def subset(self, members):
+
+        # Network of the selected genomes only, e.g. the birds still alive
+        layers = [tuple(array[members] for array in layer) for layer in self.layers]
+
+        return PopulationNetwork(self.num_inputs, self.num_outputs, self.num_slots, layers)
+
+
+    def activate(self, inputs):
+
+        # inputs [num_genomes, num_inputs] -> outputs [num_genomes, num_outputs], a network
+        # of a single genome broadcasts over any number of input rows
+        inputs = np.asarray(inputs, dtype=np.float64).reshape(-1, self.num_inputs)
+
+        values = np.zeros((len(inputs), self.num_slots))
+        values[:, :self.num_inputs] = inputs
+        rows = np.arange(len(inputs))
+
+        for (slots, sources, weights, biases, responses, _), groups in zip(self.layers, self.activation_groups):
+
+            z = biases + responses * (values[rows[:, None, None], sources] * weights).sum(axis=2)
+
+            if groups[0][1] is None:
+                out = groups[0][0](z)
+            else:
+                out = np.zeros_like(z)
+                for activation, mask in groups:
+                    mask = np.broadcast_to(mask, z.shape)
+                    out[mask] = activation(z[mask])
+
+            values[rows[:, None], slots] = out
+
+        return values[:, self.num_inputs:self.num_inputs + self.num_outputs]
+
+
+class GenomePolicy:
+
+    # One genome, e.g. the champion of a run, acting on batches of observations the way
+    # flappy_neat does: an output above 0.5 means no flap
+
+    def __init__(self, genome, config):
+
+        self.network = PopulationNetwork.create([genome], config)
+
+
+    def act(self, observations):
+
+        single = np.ndim(observations) == 1
+        outputs = self.network.activate(observations)
+        actions = np.where(outputs[:, 0] > 0.5, 0, 1)
+
+        return int(actions[0]) if single else actions
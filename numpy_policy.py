@@ -0,0 +1,183 @@
+import pickle
+import sys
+import numpy as np
+
+from rollout import sample_actions
+
+# Trained actors run without TensorFlow: export_model dumps the Dense layers of a keras
+# model into one flat float32 file and NumpyPolicy evaluates it with plain NumPy. A .npy
+# export is memory mapped on load, so starting a policy costs a file open.
+#
+#   python numpy_policy.py models/actor.h5 models/actor.npy
+#
+# Layout of the flat array: num_layers, then (inputs, units, activation) per layer, then
+# the kernel and bias of every layer in order. Sizes and activation codes are small
+# integers, float32 holds them exactly.
+
+
+def relu(x):
+    return np.maximum(x, 0)
+
+
+def softmax(logits):
+
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def linear(x):
+    return x
+
+
+ACTIVATIONS = {
+    'linear': linear,
+    'relu': relu,
+    'softmax': softmax,
+    'sigmoid': sigmoid,
+    'tanh': np.tanh,
+}
+ACTIVATION_NAMES = list(ACTIVATIONS)
+
+
+class NumpyPolicy:
+
+    # Dense network as a list of (kernel, bias, activation) layers. With a softmax output
+    # act samples from or takes the argmax of the action distribution, single observations
+    # give a single int action and batches an array.
+
+    def __init__(self, layers, seed=None):
+
+        self.layers = [(kernel, bias, ACTIVATIONS[activation]) for kernel, bias, activation in layers]
+        self.activations = [activation for _, _, activation in layers]
+        self.num_inputs = layers[0][0].shape[0]
+        self.num_actions = layers[-1][0].shape[1]
+        self.rng = np.random.default_rng(seed)
+
+
+    @staticmethod
+    def from_weights(weights, output_activation='softmax', hidden_activation='relu', seed=None):
+
+        # weights as returned by keras get_weights(), kernel and bias of every layer
+        activations = [hidden_activation] * (len(weights) // 2 - 1) + [output_activation]
+        layers = [(weights[i], weights[i + 1], activation) for i, activation in zip(range(0, len(weights), 2), activations)]
+
+        return NumpyPolicy(layers, seed)
+
+
+    @staticmethod
+    def from_model(model, seed=None):
+
+        layers = []
+        for layer in model.layers:
+            kernel, bias = layer.get_weights()
+            layers.append((kernel.astype(np.float32), bias.astype(np.float32), layer.get_config()['activation']))
+
+        return NumpyPolicy(layers, seed)
+
+
+    @staticmethod
+    def load(path, mmap=True, seed=None):
+
+        # .npy exports are memory mapped, the layers are views into the mapping
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                flat = data['weights']
+        else:
+            flat = np.load(path, mmap_mode='r' if mmap else None)
+
+        num_layers = int(flat[0])
+        header = flat[1:1 + 3 * num_layers].astype(np.int64).reshape(num_layers, 3)
+        offset = 1 + 3 * num_layers
+
+        layers = []
+        for inputs, units, activation in header:
+            kernel = flat[offset:offset + inputs * units].reshape(inputs, units)
+            offset += inputs * units
+            bias = flat[offset:offset + units]
+            offset += units
+            layers.append((kernel, bias, ACTIVATION_NAMES[activation]))
+
+        return NumpyPolicy(layers, seed)
+
+
+    def flatten(self):
+
+        header = [len(self.layers)]
+        arrays = []
+        for (kernel, bias, _), activation in zip(self.layers, self.activations):
+            header.extend([kernel.shape[0], kernel.shape[1], ACTIVATION_NAMES.index(activation)])
+            arrays.extend([kernel.ravel(), bias.ravel()])
+
+        return np.concatenate([np.array(header, dtype=np.float32)] + arrays).astype(np.float32)
+
+
+    def save(self, path):
+
+        if path.endswith('.npz'):
+            np.savez(path, weights=self.flatten())
+        else:
+            np.save(path, self.flatten())
+
+
+    def forward(self, observations):
+
+        # [N, num_inputs] -> [N, num_actions], the output of the last layer
+        x = np.asarray(observations, dtype=np.float32).reshape(-1, self.num_inputs)
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+
+        return x
+
+
+    def act(self, observations, greedy=True, epsilon=0.):
+
+        single = np.ndim(observations) == 1
+        policy_dist = self.forward(observations)
+
+        if greedy:
+            actions = policy_dist.argmax(axis=1)
+        else:
+            actions = sample_actions(policy_dist, epsilon, self.num_actions, self.rng)
+
+        return int(actions[0]) if single else actions
+
+
+def export_model(model, path):
+
+    # model is a keras model or the path of a saved one, path ends with .npy or .npz
+    if isinstance(model, str):
+        import tensorflow as tf
+        model = tf.keras.models.load_model(model, compile=False)
+
+    NumpyPolicy.from_model(model).save(path)
+
+
+def load_policy(path=None, genome=None, config_filename='config_file.txt'):
+
+    # A NumpyPolicy export, a keras .h5 actor or a pickled neat genome, all of them act
+    # greedily on batches of observations
+    if genome is None:
+        if path.endswith('.h5'):
+            import tensorflow as tf
+            return NumpyPolicy.from_model(tf.keras.models.load_model(path, compile=False))
+
+        return NumpyPolicy.load(path)
+
+    import neat
+    from neat_compile import GenomePolicy
+
+    config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                                neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                                config_filename)
+    with open(genome, 'rb') as f:
+        return GenomePolicy(pickle.load(f), config)
+
+
+if __name__ == '__main__':
+    export_model(sys.argv[1], sys.argv[2])
@@ -0,0 +1,90 @@
+import numpy as np
+
+# Observation builders of FlappyBirdEnv, chosen with its observation argument. Each
+# one is called with the sim and a bird index and has a flat observation_shape.
+#
+#   'basic'     FlappySim.get_observation, noisy height above the next gap and
+#               distance to it
+#   'extended'  basic, then velocity, height above the gap after it, distance to that
+#               gap and height above the ground
+#   'pixels'    the game downsampled downsample times, rasterized with NumPy, no display
+#               needed. Pipes and ground are 1, the bird 0.5, the background 0. Flat,
+#               pixel_shape gives (rows, columns).
+
+OBSERVATIONS = ('basic', 'extended', 'pixels')
+
+
+class BasicObservation:
+
+    observation_shape = 2
+
+    def __call__(self, sim, bird_index):
+        return sim.get_observation(bird_index)
+
+
+class ExtendedObservation:
+
+    observation_shape = 6
+
+    def __call__(self, sim, bird_index):
+
+        observation = sim.get_observation(bird_index)
+        bird_y = sim.bird_ys[bird_index]
+
+        # Until the second pipe spawns it is taken where it will spawn, at the height of the first
+        if len(sim.pipe_list) > 1:
+            gap_x, gap_y = sim.pipe_list[1]
+        else:
+            gap_x, gap_y = sim.pipe_list[0][0] + sim.SS_PIPE_GAP, sim.pipe_list[0][1]
+
+        observation.extend([sim.bird_velocity(bird_index),
+                            bird_y - gap_y,
+                            gap_x - sim.start_bird_pos[0],
+                            sim.GROUNDY - bird_y])
+
+        return observation
+
+
+class PixelObservation:
+
+    # Rasterizes into one preallocated buffer and returns a copy of it. Rasterization is
+    # conservative, every downsample x downsample cell a rect overlaps at all is filled,
+    # so thin overlaps still show and the bird never vanishes between cells.
+
+    def __init__(self, size=(400, 600), downsample=8):
+
+        self.downsample = downsample
+        self.pixel_shape = (-(-size[1] // downsample), -(-size[0] // downsample))
+        self.observation_shape = self.pixel_shape[0] * self.pixel_shape[1]
+        self.pixels = np.zeros(self.pixel_shape, dtype=np.float32)
+
+
+    def fill(self, rect, value):
+
+        left, top, width, height = rect
+        d = self.downsample
+        self.pixels[max(top, 0) // d:max(top + height + d - 1, 0) // d, max(left, 0) // d:max(left + width + d - 1, 0) // d] = value
+
+
+    def __call__(self, sim, bird_index):
+
+        self.pixels[:] = 0.
+        for bottom_pipe, top_pipe in sim.pipe_rects():
+            self.fill(bottom_pipe, 1.)
+            self.fill(top_pipe, 1.)
+        self.pixels[sim.GROUNDY // self.downsample:] = 1.
+        self.fill(sim.bird_rect(bird_index), 0.5)
+
+        return self.pixels.ravel().copy()
+
+
+def make_observation(observation, size=(400, 600), downsample=8):
+
+    if observation == 'basic':
+        return BasicObservation()
+    if observation == 'extended':
+        return ExtendedObservation()
+    if observation == 'pixels':
+        return PixelObservation(size, downsample)
+
+    raise ValueError(f"Got unexpected observation - {observation}")
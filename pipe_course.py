@@ -0,0 +1,177 @@
+import collections
+import hashlib
+import os
+import random
+import tempfile
+import numpy as np
+
+# Pipe spacing is fixed, so the gap heights are the whole course of a seed. A course is
+# the first `length` heights a seeded env would draw, kept as a small int16 array:
+#
+#   python_course   the random.Random(f"{seed}-pipes") stream of FlappySim
+#   numpy_course    the Generator stream of one VectorFlappyEnv world
+#
+# PipeCourseCache keeps recently used courses in memory and, with a directory, python
+# courses as .npy files that other processes memory map read-only instead of drawing
+# them again. The directory is opt-in, shared_cache takes it from FLAPPY_COURSE_DIR:
+#
+#   FLAPPY_COURSE_DIR=/tmp/flappy-courses python evaluate.py --genome winner.pkl
+
+COURSE_LENGTH = 1024
+DIRECTORY_VARIABLE = 'FLAPPY_COURSE_DIR'
+
+
+def python_random(seed, pipe_pos_range, skip=0):
+
+    # The pipe generator of FlappySim after `skip` heights have been drawn
+    rng = random.Random(f"{seed}-pipes")
+    for _ in range(skip):
+        rng.randint(*pipe_pos_range)
+
+    return rng
+
+
+def python_course(seed, length, pipe_pos_range):
+
+    rng = random.Random(f"{seed}-pipes")
+    return np.array([rng.randint(*pipe_pos_range) for _ in range(length)], dtype=np.int16)
+
+
+def numpy_random(seed_sequence, pipe_pos_range, skip=0):
+
+    # Bounded integers are drawn one after the other, so `skip` heights in one call leave
+    # the generator where `skip` heights drawn block by block would
+    rng = np.random.default_rng(seed_sequence)
+    if skip:
+        rng.integers(pipe_pos_range[0], pipe_pos_range[1] + 1, size=skip)
+
+    return rng
+
+
+def numpy_course(seed_sequence, length, pipe_pos_range):
+
+    rng = np.random.default_rng(seed_sequence)
+    return rng.integers(pipe_pos_range[0], pipe_pos_range[1] + 1, size=length).astype(np.int16)
+
+
+class PipeCourseCache:
+
+    # LRU cache of at most maxsize courses. With a directory, python courses are also
+    # written there once and loaded memory mapped, so every process using the same
+    # directory shares one read-only copy through the page cache. The directory keeps
+    # at most max_files courses, the least recently used files are removed. numpy
+    # courses are never written, drawing one is cheaper than a file.
+
+    def __init__(self, maxsize=64, directory=None, max_files=256):
+
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_files = max_files
+        self.courses = collections.OrderedDict()
+
+
+    def get(self, kind, seed, length=COURSE_LENGTH, pipe_pos_range=(240, 450)):
+
+        # kind is 'python' with a FlappySim seed or 'numpy' with a SeedSequence
+        if kind == 'python':
+            key = f"python-{seed}-{pipe_pos_range[0]}-{pipe_pos_range[1]}-{length}"
+        elif kind == 'numpy':
+            key = f"numpy-{seed.entropy}-{seed.spawn_key}-{pipe_pos_range[0]}-{pipe_pos_range[1]}-{length}"
+        else:
+            raise ValueError(f"Got unexpected course kind - {kind}")
+
+        course = self.courses.get(key)
+        if course is not None:
+            self.courses.move_to_end(key)
+            return course
+
+        if kind == 'numpy':
+            course = numpy_course(seed, length, pipe_pos_range)
+            course.setflags(write=False)
+        else:
+            course = self.load(key)
+            if course is None:
+                course = self.store(key, python_course(seed, length, pipe_pos_range))
+
+        self.courses[key] = course
+        if len(self.courses) > self.maxsize:
+            self.courses.popitem(last=False)
+
+        return course
+
+
+    def path(self, key):
+
+        # Keys of numpy seeds can be long, file names are their digest
+        return os.path.join(self.directory, f'course-{hashlib.sha1(key.encode()).hexdigest()}.npy')
+
+
+    def load(self, key):
+
+        if self.directory is None:
+            return None
+
+        # A file removed by another process in between is drawn again
+        path = self.path(key)
+        try:
+            course = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return course
+
+
+    def store(self, key, course):
+
+        if self.directory is None:
+            course.setflags(write=False)
+            return course
+
+        # Written to a temporary file renamed in place, readers never see a partial
+        # course. A lost course is only drawn again, so there is no fsync.
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, course)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        self.evict()
+        course.setflags(write=False)
+        return course
+
+
+    def evict(self):
+
+        # Removes the least recently used files beyond max_files
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('course-') and entry.name.endswith('.npy'):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+
+        files.sort()
+        for _, path in files[:max(len(files) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+    def __getstate__(self):
+
+        # Sent to worker processes without its entries, they map the files themselves
+        return {'maxsize': self.maxsize, 'directory': self.directory, 'max_files': self.max_files,
+                'courses': collections.OrderedDict()}
+
+
+def shared_cache():
+
+    # Cache of the module-level users, on disk only when FLAPPY_COURSE_DIR is set
+    return PipeCourseCache(directory=os.environ.get(DIRECTORY_VARIABLE) or None)
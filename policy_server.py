@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import collections
+import json
+import struct
+import time
+import numpy as np
+
+from numpy_policy import load_policy
+
+# Serves a trained policy to many concurrent game clients. Observations arriving within
+# max_delay of the oldest waiting one are answered by a single batched forward pass.
+#
+#   python policy_server.py serve --policy models/actor.npy --port 7000
+#   python policy_server.py serve --genome winner.pkl --config config_file.txt --unix /tmp/flappy.sock
+#   python policy_server.py load --port 7000 --clients 64 --requests 1000
+#
+# Every connection is a stream of fixed-size frames: a request is the two floats of a
+# get_observation, the reply is the action as one byte. Replies come back in request
+# order, so clients may pipeline requests.
+
+REQUEST = struct.Struct('<2d')
+RESPONSE = struct.Struct('<B')
+
+
+class ServerMetrics:
+
+    # Counters plus the latencies and batch sizes of the last `window` requests and batches
+
+    def __init__(self, window=10000):
+
+        self.requests = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.latencies = collections.deque(maxlen=window)
+        self.batch_sizes = collections.deque(maxlen=window)
+        self.queue_depths = collections.deque(maxlen=window)
+
+
+    def record_batch(self, queue_depth, latencies):
+
+        self.requests += len(latencies)
+        self.batches += 1
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+        self.latencies.extend(latencies)
+        self.batch_sizes.append(len(latencies))
+        self.queue_depths.append(queue_depth)
+
+
+    def snapshot(self):
+
+        latencies = np.asarray(self.latencies) * 1e6
+        return {'requests': self.requests,
+                'batches': self.batches,
+                'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.,
+                'mean_queue_depth': float(np.mean(self.queue_depths)) if self.queue_depths else 0.,
+                'max_queue_depth': self.max_queue_depth,
+                'p50_latency_us': float(np.percentile(latencies, 50)) if len(latencies) else 0.,
+                'p99_latency_us': float(np.percentile(latencies, 99)) if len(latencies) else 0.}
+
+
+class PolicyServer:
+
+    # policy is anything with a batched act(observations) -> actions, a NumpyPolicy or a
+    # neat_compile.GenomePolicy. A batch is run as soon as max_batch requests are waiting,
+    # every connected client has one waiting, or the oldest of them has waited max_delay
+    # seconds.
+
+    def __init__(self, policy, max_batch=256, max_delay=0.002):
+
+        self.policy = policy
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.metrics = ServerMetrics()
+
+        # (observation, future, arrival time) of every request not yet answered
+        self.pending = collections.deque()
+        # Writer and handler task of every open connection
+        self.connections = {}
+        self.arrived = None
+        self.full = None
+        self.server = None
+        self.batcher = None
+
+
+    async def start(self, host='127.0.0.1', port=7000, unix=None):
+
+        self.arrived = asyncio.Event()
+        self.full = asyncio.Event()
+        self.batcher = asyncio.ensure_future(self.run_batches())
+
+        if unix is not None:
+            self.server = await asyncio.start_unix_server(self.handle_client, unix)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, host, port)
+
+        return self.server
+
+
+    async def close(self):
+
+        # Closing the transports ends every handler with a read error
+        self.server.close()
+        handlers = list(self.connections.values())
+        for writer in list(self.connections):
+            writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        await self.server.wait_closed()
+        self.batcher.cancel()
+
+
+    def submit(self, observation):
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((observation, future, time.perf_counter()))
+        self.arrived.set()
+        if len(self.pending) >= min(self.max_batch, len(self.connections)):
+            self.full.set()
+
+        return future
+
+
+    async def handle_client(self, reader, writer):
+
+        # Requests are read as fast as they come, replies are written in order by reply()
+        replies = asyncio.Queue()
+        replier = asyncio.ensure_future(self.reply(replies, writer))
+        self.connections[writer] = asyncio.current_task()
+
+        try:
+            while True:
+                data = await reader.readexactly(REQUEST.size)
+                replies.put_nowait(self.submit(REQUEST.unpack(data)))
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            replies.put_nowait(None)
+            await replier
+            writer.close()
+            del self.connections[writer]
+
+
+    async def reply(self, replies, writer):
+
+        while True:
+            future = await replies.get()
+            if future is None:
+                return
+
+            writer.write(RESPONSE.pack(await future))
+            if replies.empty():
+                try:
+                    await writer.drain()
+                except ConnectionResetError:
+                    return
+
+
+    async def run_batches(self):
+
+        while True:
+            await self.arrived.wait()
+
+            remaining = self.pending[0][2] + self.max_delay - time.perf_counter()
+            if remaining > 0 and not self.full.is_set():
+                try:
+                    await asyncio.wait_for(self.full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            queue_depth = len(self.pending)
+            batch = [self.pending.popleft() for _ in range(min(queue_depth, self.max_batch))]
+            if len(self.pending) < min(self.max_batch, len(self.connections)):
+                self.full.clear()
+            if not self.pending:
+                self.arrived.clear()
+
+            actions = self.policy.act(np.array([observation for observation, _, _ in batch]))
+
+            now = time.perf_counter()
+            for (_, future, arrival), action in zip(batch, actions):
+                if not future.cancelled():
+                    future.set_result(int(action))
+
+            self.metrics.record_batch(queue_depth, [now - arrival for _, _, arrival in batch])
+
+
+async def open_connection(host='127.0.0.1', port=7000, unix=None):
+
+    if unix is not None:
+        return await asyncio.open_unix_connection(unix)
+
+    return await asyncio.open_connection(host, port)
+
+
+async def run_client(observations, host='127.0.0.1', port=7000, unix=None):
+
+    # One game client asking for an action per observation, returns the round trip times
+    reader, writer = await open_connection(host, port, unix)
+    latencies = []
+
+    for observation in observations:
+        start = time.perf_counter()
+        writer.write(REQUEST.pack(*observation))
+        await reader.readexactly(RESPONSE.size)
+        latencies.append(time.perf_counter() - start)
+
+    writer.close()
+    await writer.wait_closed()
+
+    return latencies
+
+
+async def load_test(num_clients=64, num_requests=1000, host='127.0.0.1', port=7000, unix=None, seed=0):
+
+    # Observations are drawn around the values a game produces, see FlappySim.get_observation
+    rng = np.random.default_rng(seed)
+    observations = rng.uniform((-200., 0.), (200., 350.), size=(num_clients, num_requests, 2))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_client(client_observations, host, port, unix) for client_observations in observations))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.concatenate(results) * 1e6
+    return {'clients': num_clients,
+            'requests': num_clients * num_requests,
+            'requests_per_s': num_clients * num_requests / elapsed,
+            'p50_latency_us': float(np.percentile(latencies, 50)),
+            'p99_latency_us': float(np.percentile(latencies, 99))}
+
+
+async def serve(server, stats_every, host, port, unix):
+
+    await server.start(host, port, unix)
+    print(f"Serving on {unix or f'{host}:{port}'}")
+
+    while True:
+        await asyncio.sleep(stats_every)
+        print(json.dumps(server.metrics.snapshot()), flush=True)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Batched Flappy Bird policy server')
+    parser.add_argument('mode', choices=['serve', 'load'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7000)
+    parser.add_argument('--unix', default=None, help='Unix socket path, used instead of TCP')
+    parser.add_argument('--policy', default='models/actor.npy', help='numpy_policy export or keras .h5 actor')
+    parser.add_argument('--genome', default=None, help='pickled neat genome, served instead of --policy')
+    parser.add_argument('--config', default='config_file.txt', help='neat config of --genome')
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--max-delay-ms', type=float, default=2.)
+    parser.add_argument('--stats-every', type=float, default=10., help='seconds between metric lines')
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=1000, help='requests per load test client')
+    args = parser.parse_args(argv)
+
+    if args.mode == 'load':
+        report = asyncio.run(load_test(args.clients, args.requests, args.host, args.port, args.unix))
+        print(json.dumps(report, indent=2))
+        return report
+
+    policy = load_policy(args.policy, args.genome, args.config)
+    server = PolicyServer(policy, args.max_batch, args.max_delay_ms / 1000)
+    try:
+        asyncio.run(serve(server, args.stats_every, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        print(json.dumps(server.metrics.snapshot()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import hashlib
+import numbers
+import numpy as np
+
+from flappy_sim import FlappySim, BIRD_SIZE, PIPE_SIZE, NO_COLLISION, PIPE, TOP, BOTTOM, FRACTION_BITS
+
+
+def noise_seed(seed):
+
+    # SeedSequence of the noise stream of seed. Non-negative integers keep the [seed, 1]
+    # they always had, any other seed FlappySim takes, e.g. negative or a string, is
+    # hashed to one first.
+    if seed is None:
+        return None
+    if not (isinstance(seed, numbers.Integral) and seed >= 0):
+        seed = int.from_bytes(hashlib.sha256(str(seed).encode()).digest(), 'big')
+
+    return np.random.SeedSequence([int(seed), 1])
+
+
+class PopulationSim(FlappySim):
+
+    # FlappySim for large populations sharing one world. Bird heights, velocities and
+    # alive flags are arrays and the batch methods below move, observe and collide any
+    # set of birds with a handful of NumPy operations. Pipes stay shared Python lists,
+    # there are never more than MAX_PIPES of them. With fixed physics both bird arrays
+    # are int32.
+
+    def __init__(self, size=(400, 600), gravity=0.25, jump_velocity=-3, num_birds=1, seed=None, course_cache=None,
+                 physics='float'):
+
+        super().__init__(size, gravity, jump_velocity, num_birds, seed, course_cache, physics)
+
+        if physics == 'fixed':
+            self.bird_ys = np.array(self.bird_ys, dtype=np.int32)
+            self.bird_velocities = np.array(self.bird_velocities, dtype=np.int32)
+            self.move_birds = self.move_birds_fixed
+        else:
+            self.bird_ys = np.array(self.bird_ys, dtype=np.int64)
+            self.bird_velocities = np.array(self.bird_velocities, dtype=np.float64)
+
+
+    def seed(self, seed=None):
+
+        super().seed(seed)
+        self.noise_rng = np.random.default_rng(noise_seed(seed))
+
+
+    def bird_rect(self, bird_index):
+
+        left, top, width, height = super().bird_rect(bird_index)
+        return (left, int(top), width, height)
+
+
+    def move_birds(self, birds, flaps):
+
+        velocities = self.bird_velocities[birds]
+        velocities[flaps] = self.jump_velocity
+        velocities += self.GRAVITY
+
+        self.bird_velocities[birds] = velocities
+        # Truncated like the integer Rect position of move_bird
+        self.bird_ys[birds] = (self.bird_ys[birds] + velocities).astype(np.int64)
+
+
+    def move_birds_fixed(self, birds, flaps):
+
+        velocities = self.bird_velocities[birds]
+        velocities[flaps] = self.jump_fixed
+        velocities += self.gravity_fixed
+
+        # Truncated toward zero like fixed_move
+        self.bird_velocities[birds] = velocities
+        positions = (self.bird_ys[birds] << FRACTION_BITS) + velocities
+        self.bird_ys[birds] = np.sign(positions) * (np.abs(positions) >> FRACTION_BITS)
+
+
+    def check_collisions(self, birds):
+
+        bird_top = self.bird_ys[birds] - BIRD_SIZE[1] // 2
+        bird_bottom = bird_top + BIRD_SIZE[1]
+        bird_right = self.bird_left + BIRD_SIZE[0]
+
+        place = np.full(len(birds), NO_COLLISION, dtype=np.int8)
+        place[bird_bottom >= self.GROUNDY] = BOTTOM
+        place[bird_top <= 0] = TOP
+
+        # All birds share one column, so only the pipe pair overlapping it can be hit
+        for centerx, pipe_pos in self.pipes:
+            pipe_left = centerx - PIPE_SIZE[0] // 2
+            if self.bird_left < pipe_left + PIPE_SIZE[0] and bird_right > pipe_left:
+                top_pipe_bottom = pipe_pos - self.TB_PIPE_GAP
+                bottom_pipe_hit = (bird_top < pipe_pos + PIPE_SIZE[1]) & (bird_bottom > pipe_pos)
+                top_pipe_hit = (bird_top < top_pipe_bottom) & (bird_bottom > top_pipe_bottom - PIPE_SIZE[1])
+                place[bottom_pipe_hit | top_pipe_hit] = PIPE
+
+        return place != NO_COLLISION, place
+
+
+    def get_observations(self, birds):
+
+        observations = np.empty((len(birds), 2), dtype=np.float64)
+        observations[:, 0] = self.bird_ys[birds] - self.pipe_list[0][1]
+        observations[:, 1] = self.pipe_list[0][0] - self.start_bird_pos[0]
+        observations += self.noise_rng.random((len(birds), 2))
+
+        return observations
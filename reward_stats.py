@@ -0,0 +1,180 @@
+import collections
+import json
+import math
+
+# Reward statistics of arbitrarily long runs in constant memory, replacing a growing
+# total_rewards list.
+#
+#   history = RewardHistory(JSONLWriter('rewards.jsonl'), window=10, flush_every=50)
+#   history.update(actor_critic.current_reward)
+#   print(history.mean, history.window.mean, history.max)
+#
+# Every update makes one row (episode, reward, running mean and std, window mean, EMA,
+# max); rows are written to the writer every flush_every episodes and on flush, so the
+# whole run can be plotted from the file with load_history.
+
+
+class RunningStats:
+
+    # Welford's running mean and variance
+
+    def __init__(self):
+
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+        self.max = -math.inf
+        self.min = math.inf
+
+
+    def update(self, value):
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.max = max(self.max, value)
+        self.min = min(self.min, value)
+
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else 0.
+
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class WindowStats:
+
+    # Mean of the last size values, like np.mean(values[-size:])
+
+    def __init__(self, size=10):
+
+        self.values = collections.deque(maxlen=size)
+
+
+    def update(self, value):
+        self.values.append(value)
+
+
+    @property
+    def mean(self):
+        return sum(self.values) / len(self.values) if self.values else 0.
+
+
+class EMA:
+
+    # Exponential moving average of the notebook's plot, k = 2 / (span + 1). Like there,
+    # an average of exactly 0 counts as no average yet.
+
+    def __init__(self, k=2 / 51):
+
+        self.k = k
+        self.value = 0.
+
+
+    def update(self, value):
+
+        self.value = self.value * (1 - self.k) + value * self.k if self.value != 0 else value
+
+
+class RewardHistory:
+
+    def __init__(self, writer=None, window=10, k=2 / 51, flush_every=50):
+
+        self.writer = writer
+        self.flush_every = flush_every
+        self.stats = RunningStats()
+        self.window = WindowStats(window)
+        self.ema = EMA(k)
+        self.rows = []
+
+
+    @property
+    def episodes(self):
+        return self.stats.count
+
+
+    @property
+    def mean(self):
+        return self.stats.mean
+
+
+    @property
+    def max(self):
+        return self.stats.max
+
+
+    def update(self, reward):
+
+        reward = float(reward)
+        self.stats.update(reward)
+        self.window.update(reward)
+        self.ema.update(reward)
+
+        row = {'episode': self.stats.count - 1, 'reward': reward, 'mean': self.stats.mean, 'std': self.stats.std,
+               'window_mean': self.window.mean, 'ema': self.ema.value, 'max': self.stats.max}
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_every:
+            self.flush()
+
+        return row
+
+
+    def flush(self):
+
+        if self.writer is not None:
+            for row in self.rows:
+                self.writer.write(row)
+        self.rows = []
+
+
+    def close(self):
+
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+    def getstate(self):
+
+        # Rows not flushed yet are written before the state is taken, a resumed run
+        # appends after them
+        self.flush()
+        return {'stats': vars(self.stats).copy(), 'window': list(self.window.values),
+                'window_size': self.window.values.maxlen, 'ema': self.ema.value}
+
+
+    def setstate(self, state):
+
+        # Also takes the total_rewards list of older checkpoints, whose rewards are
+        # replayed into the history and its file
+        if isinstance(state, list):
+            for reward in state:
+                self.update(reward)
+            return
+
+        vars(self.stats).update(state['stats'])
+        self.window.values = collections.deque(state['window'], maxlen=state['window_size'])
+        self.ema.value = state['ema']
+
+
+def load_history(path):
+
+    # Columns of a JSONL file written by RewardHistory, e.g. for plotting. Episodes played
+    # again after resuming from a checkpoint keep their latest row.
+    rows = {}
+    with open(path) as f:
+        for line in f:
+            row = json.loads(line)
+            rows[row['episode']] = row
+
+    columns = collections.defaultdict(list)
+    for episode in sorted(rows):
+        for key, value in rows[episode].items():
+            columns[key].append(value)
+
+    return dict(columns)
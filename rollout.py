@@ -0,0 +1,83 @@
+import numpy as np
+
+
+def sample_actions(policy_dist, epsilon, num_actions, rng):
+
+    # Epsilon-greedy sampling of every row of policy_dist at once (inverse CDF)
+    cumulative = np.cumsum(policy_dist, axis=1)
+    actions = (rng.random((len(policy_dist), 1)) * cumulative[:, -1:] > cumulative).sum(axis=1)
+    actions = np.minimum(actions, num_actions - 1)
+
+    explore = rng.random(len(actions)) <= epsilon
+    actions[explore] = rng.integers(num_actions, size=explore.sum())
+
+    return actions
+
+
+class RolloutBuffer:
+
+    # Preallocated storage for fixed-length rollouts of n_steps steps from num_envs worlds.
+    # Arrays are laid out [step, env] so the reverse scan below runs over time with every
+    # env handled at once.
+
+    def __init__(self, n_steps, num_envs, observation_shape):
+
+        self.n_steps = n_steps
+        self.num_envs = num_envs
+
+        self.observations = np.zeros((n_steps, num_envs, observation_shape), dtype=np.float32)
+        self.actions = np.zeros((n_steps, num_envs), dtype=np.int32)
+        self.rewards = np.zeros((n_steps, num_envs), dtype=np.float32)
+        self.dones = np.zeros((n_steps, num_envs), dtype=np.float32)
+        self.values = np.zeros((n_steps, num_envs), dtype=np.float32)
+
+        self.returns = np.zeros((n_steps, num_envs), dtype=np.float32)
+        self.advantages = np.zeros((n_steps, num_envs), dtype=np.float32)
+
+        self.step = 0
+
+
+    def reset(self):
+        self.step = 0
+
+
+    def add(self, observations, actions, rewards, dones, values):
+
+        if self.step >= self.n_steps:
+            raise ValueError(f"Rollout buffer is full ({self.n_steps} steps)")
+
+        self.observations[self.step] = observations
+        self.actions[self.step] = actions
+        self.rewards[self.step] = rewards
+        self.dones[self.step] = dones
+        self.values[self.step] = values
+        self.step += 1
+
+
+    def compute_returns(self, last_values, discount=0.99, gae_lambda=0.95):
+
+        # Generalized advantage estimation, gae_lambda=1 gives plain n-step returns.
+        # Worlds that finished at step t do not bootstrap from the reset observation.
+        last_gae = np.zeros(self.num_envs, dtype=np.float32)
+        next_values = np.asarray(last_values, dtype=np.float32)
+
+        for t in reversed(range(self.step)):
+            next_non_terminal = 1. - self.dones[t]
+            delta = self.rewards[t] + discount * next_values * next_non_terminal - self.values[t]
+            last_gae = delta + discount * gae_lambda * next_non_terminal * last_gae
+            self.advantages[t] = last_gae
+            next_values = self.values[t]
+
+        self.returns[:self.step] = self.advantages[:self.step] + self.values[:self.step]
+
+        return self.returns[:self.step], self.advantages[:self.step]
+
+
+    def get(self):
+
+        # Flattened (observations, actions, returns) of the stored steps for ActorCritic.train_step
+        size = self.step * self.num_envs
+
+        return (self.observations[:self.step].reshape(size, -1),
+                self.actions[:self.step].reshape(size),
+                self.returns[:self.step].reshape(size))
@@ -0,0 +1,23 @@
+import math
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+from a2c import ActorCritic
+from flappy_env import FlappyBirdEnv
+
+
+def test_segmented_return_stats_stay_bounded():
+
+    # Bootstrapped targets must not feed the return statistics, they used to grow
+    # without bound within a few dozen short segments
+    tf.keras.utils.set_random_seed(0)
+    env = FlappyBirdEnv(seed=0)
+    actor_critic = ActorCritic([env.observation_shape], env.action_shape, seed=0)
+    bound = 10 / (1 - actor_critic.discount)
+
+    for _ in range(30):
+        actor_critic.train_episode(env, 10000, segment_length=16)
+        stats = actor_critic.return_stats
+        assert math.isfinite(stats.mean) and math.isfinite(stats.std)
+        assert abs(stats.mean) <= bound and stats.std <= bound
@@ -0,0 +1,302 @@
+import numpy as np
+
+from pipe_course import COURSE_LENGTH, numpy_random
+from flappy_sim import BIRD_SIZE, PIPE_SIZE, MAX_PIPES, NO_COLLISION, PIPE, TOP, BOTTOM, PHYSICS, FRACTION_BITS, to_fixed
+
+PIPE_BLOCK = 64
+FRAME_ORDERS = ('game', 'neat')
+
+
+class VectorFlappyEnv:
+
+    # Steps num_envs independent worlds at once, every world follows the same
+    # physics as flappy_env.FlappyBirdEnv. Finished worlds are reset automatically,
+    # so the observation returned for them is the first one of the new episode.
+    # With physics 'fixed' the birds are int32 arrays, velocities in fixed point.
+    # frame_order 'neat' runs the frames of flappy_neat instead, pipes move before the
+    # observation and birds collide before the pipes move again, and random_start puts
+    # birds at a random height like flappy_neat.FlappyBirdEnv.random_bird_y.
+
+    STATE_ARRAYS = ('bird_y', 'bird_velocity', 'pipe_x', 'pipe_y', 'pipe_count', 'pipes_passed', 'pipe_block', 'pipe_block_pos', 'course_pos')
+
+    def __init__(self, num_envs, size=(400, 600), gravity=0.25, jump_velocity=-3, step_size=4, seed=None, course_cache=None, physics='float',
+                 frame_order='game', random_start=False):
+
+        if physics not in PHYSICS:
+            raise ValueError(f"Got unexpected physics - {physics}")
+        if frame_order not in FRAME_ORDERS:
+            raise ValueError(f"Got unexpected frame order - {frame_order}")
+
+        self.num_envs = num_envs
+        self.physics = physics
+        self.frame_order = frame_order
+        self.random_start = random_start
+        self.SIZE = size
+        self.GRAVITY = gravity
+        self.observation_shape = 2
+        self.action_shape = 2
+        self.jump_velocity = jump_velocity
+        if physics == 'fixed':
+            self.gravity_fixed = to_fixed(gravity)
+            self.jump_fixed = to_fixed(jump_velocity)
+        self.TB_PIPE_GAP = int(0.25 * self.SIZE[1])
+        self.SS_PIPE_GAP = self.SIZE[0] // 2
+        self.GROUNDY = int(0.85 * self.SIZE[1])
+
+        self.pipe_moving_freq = 3
+        self.step_size = step_size
+
+        self.start_bird_pos = [int(0.2 * self.SIZE[0]), int(0.425 * self.SIZE[1])]
+        self.pipe_spawn_x = int(self.SIZE[0] + PIPE_SIZE[0] // 2)
+        self.pipe_pos_range = (int(0.4 * self.SIZE[1]), int(0.75 * self.SIZE[1]))
+
+        # Bird rect is fixed horizontally, bird_y holds its centery
+        self.bird_left = self.start_bird_pos[0] - BIRD_SIZE[0] // 2
+        if physics == 'fixed':
+            self.bird_y = np.zeros(num_envs, dtype=np.int32)
+            self.bird_velocity = np.zeros(num_envs, dtype=np.int32)
+        else:
+            self.bird_y = np.zeros(num_envs, dtype=np.int64)
+            self.bird_velocity = np.zeros(num_envs, dtype=np.float64)
+
+        # Pipes live in a ring buffer, the k-th pipe of an episode is kept in slot k % MAX_PIPES.
+        # pipe_x is the centerx of both pipes and pipe_y the top of the bottom pipe.
+        self.pipe_x = np.zeros((num_envs, MAX_PIPES), dtype=np.int64)
+        self.pipe_y = np.zeros((num_envs, MAX_PIPES), dtype=np.int64)
+        self.pipe_count = np.zeros(num_envs, dtype=np.int64)
+        self.pipes_passed = np.zeros(num_envs, dtype=np.int64)
+
+        # Every world draws its pipe heights from its own generator, PIPE_BLOCK heights
+        # at a time, so a world's course does not depend on num_envs or on the other worlds
+        self.pipe_block = np.zeros((num_envs, PIPE_BLOCK), dtype=np.int64)
+        self.pipe_block_pos = np.zeros(num_envs, dtype=np.int64)
+
+        # With a pipe_course.PipeCourseCache, blocks of seeded worlds are slices of their
+        # cached course, course_pos is the number of heights taken from it
+        self.course_cache = course_cache
+        self.course_pos = np.zeros(num_envs, dtype=np.int64)
+
+        # Pipes passed and place of collision of the last finished episode of every world
+        self.last_pipes_passed = np.zeros(num_envs, dtype=np.int64)
+        self.last_collision = np.zeros(num_envs, dtype=np.int8)
+
+        self.env_index = np.arange(num_envs)
+        self.seed(seed)
+        self.reset_worlds(np.ones(num_envs, dtype=bool))
+
+
+    def seed(self, seed=None):
+
+        # World i is seeded like a VectorFlappyEnv(1, seed=SeedSequence(seed).spawn(num_envs)[i]),
+        # observation noise and sampled actions share one batch stream
+        seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        batch_seed, *world_seeds = seed_sequence.spawn(self.num_envs + 1)
+
+        self.random = np.random.default_rng(batch_seed)
+        self.pipe_rngs = [np.random.default_rng(world_seed) for world_seed in world_seeds]
+        self.pipe_block_pos[:] = PIPE_BLOCK
+
+        # Unseeded worlds never repeat a course, caching them would only fill the cache.
+        # Courses are looked up when a world first needs pipes.
+        self.world_seeds = world_seeds
+        self.courses = None
+        self.course_pos[:] = 0
+        if self.course_cache is not None and seed is not None:
+            self.courses = [None] * self.num_envs
+
+
+    def getstate(self):
+
+        # Worlds are usually mid-episode, so the whole simulation is saved with the generators
+        return {'arrays': {name: getattr(self, name).copy() for name in self.STATE_ARRAYS},
+                'random': self.random.bit_generator.state,
+                'pipe_rngs': [rng.bit_generator.state for rng in self.pipe_rngs]}
+
+
+    def setstate(self, state):
+
+        if len(state['pipe_rngs']) != self.num_envs:
+            raise ValueError(f"Got state of {len(state['pipe_rngs'])} worlds for {self.num_envs} worlds")
+
+        for name in self.STATE_ARRAYS:
+            getattr(self, name)[:] = state['arrays'][name]
+        self.random.bit_generator.state = state['random']
+        for rng, rng_state in zip(self.pipe_rngs, state['pipe_rngs']):
+            rng.bit_generator.state = rng_state
+
+
+    def next_pipe_pos(self, envs):
+
+        for env in envs[self.pipe_block_pos[envs] == PIPE_BLOCK]:
+            self.pipe_block[env] = self.next_pipe_block(env)
+            self.pipe_block_pos[env] = 0
+
+        pipe_pos = self.pipe_block[envs, self.pipe_block_pos[envs]]
+        self.pipe_block_pos[envs] += 1
+
+        return pipe_pos
+
+
+    def next_pipe_block(self, env):
+
+        if self.courses is None or self.course_pos[env] >= COURSE_LENGTH:
+            return self.pipe_rngs[env].integers(self.pipe_pos_range[0], self.pipe_pos_range[1] + 1, size=PIPE_BLOCK)
+
+        if self.courses[env] is None:
+            self.courses[env] = self.course_cache.get('numpy', self.world_seeds[env], COURSE_LENGTH, self.pipe_pos_range)
+
+        start = self.course_pos[env]
+        self.course_pos[env] += PIPE_BLOCK
+        if self.course_pos[env] == COURSE_LENGTH:
+            # Past its course a world continues with the generator of the same stream
+            self.pipe_rngs[env] = numpy_random(self.world_seeds[env], self.pipe_pos_range, COURSE_LENGTH)
+
+        return self.courses[env][start:start + PIPE_BLOCK]
+
+
+    def add_pipes(self):
+
+        last_pipe_x = self.pipe_x[self.env_index, (self.pipe_count - 1) % MAX_PIPES]
+        spawn = (self.pipe_count == 0) | (self.pipe_spawn_x - last_pipe_x >= self.SS_PIPE_GAP)
+        if not spawn.any():
+            return
+
+        envs = self.env_index[spawn]
+        slots = self.pipe_count[envs] % MAX_PIPES
+        self.pipe_x[envs, slots] = self.pipe_spawn_x
+        self.pipe_y[envs, slots] = self.next_pipe_pos(envs)
+        self.pipe_count[envs] += 1
+
+
+    def check_collision(self):
+
+        bird_top = self.bird_y - BIRD_SIZE[1] // 2
+        bird_bottom = bird_top + BIRD_SIZE[1]
+        pipe_left = self.pipe_x - PIPE_SIZE[0] // 2
+
+        # Same strict overlap test as pygame.Rect.colliderect, unused slots never overlap
+        x_overlap = (self.bird_left < pipe_left + PIPE_SIZE[0]) & (self.bird_left + BIRD_SIZE[0] > pipe_left)
+        x_overlap &= np.arange(MAX_PIPES) < self.pipe_count[:, None]
+
+        bird_top, bird_bottom = bird_top[:, None], bird_bottom[:, None]
+        bottom_pipe_hit = (bird_top < self.pipe_y + PIPE_SIZE[1]) & (bird_bottom > self.pipe_y)
+        top_pipe_bottom = self.pipe_y - self.TB_PIPE_GAP
+        top_pipe_hit = (bird_top < top_pipe_bottom) & (bird_bottom > top_pipe_bottom - PIPE_SIZE[1])
+        pipe_hit = (x_overlap & (bottom_pipe_hit | top_pipe_hit)).any(axis=1)
+
+        place = np.full(self.num_envs, NO_COLLISION, dtype=np.int8)
+        place[bird_bottom[:, 0] >= self.GROUNDY] = BOTTOM
+        place[bird_top[:, 0] <= 0] = TOP
+        place[pipe_hit] = PIPE
+
+        return place != NO_COLLISION, place
+
+
+    def get_observation(self):
+
+        next_slot = self.pipes_passed % MAX_PIPES
+        gap_x = self.pipe_x[self.env_index, next_slot]
+        gap_y = self.pipe_y[self.env_index, next_slot] - (self.TB_PIPE_GAP // 2)
+
+        observation = np.empty((self.num_envs, 2), dtype=np.float64)
+        observation[:, 0] = self.bird_y - gap_y
+        observation[:, 1] = gap_x - self.start_bird_pos[0]
+        observation += self.random.random((self.num_envs, 2))
+
+        return observation
+
+
+    def move_birds(self):
+
+        # Rect attributes are integers, the float position is truncated like pygame does
+        if self.physics == 'fixed':
+            positions = (self.bird_y << FRACTION_BITS) + self.bird_velocity
+            self.bird_y = np.sign(positions) * (np.abs(positions) >> FRACTION_BITS)
+        else:
+            self.bird_y = (self.bird_y + self.bird_velocity).astype(np.int64)
+
+
+    def move_pipes(self):
+
+        self.pipe_x -= self.pipe_moving_freq
+
+        next_slot = self.pipes_passed % MAX_PIPES
+        passed = self.pipe_x[self.env_index, next_slot] <= self.start_bird_pos[0]
+        self.pipes_passed += passed
+
+        return passed
+
+
+    def reset_worlds(self, mask):
+
+        self.bird_velocity[mask] = 0
+        if self.random_start:
+            self.bird_y[mask] = self.random.integers(int(self.SIZE[1] * 0.1), int(0.8 * self.SIZE[1]) + 1, size=int(mask.sum()))
+        else:
+            self.bird_y[mask] = self.start_bird_pos[1]
+        self.pipe_x[mask] = 0
+        self.pipe_y[mask] = 0
+        self.pipe_count[mask] = 0
+        self.pipes_passed[mask] = 0
+        self.add_pipes()
+
+        # NEAT frames start by moving the pipes, the first observation sees them moved once.
+        # The first pipe spawns far right, so it is neither passed nor followed by another.
+        if self.frame_order == 'neat':
+            self.pipe_x[mask] -= self.pipe_moving_freq
+
+
+    def reset(self, seed=None):
+
+        if seed is not None:
+            self.seed(seed)
+
+        self.reset_worlds(np.ones(self.num_envs, dtype=bool))
+
+        return self.get_observation()
+
+
+    def sample_action(self):
+
+        return self.random.integers(0, 2, size=self.num_envs)
+
+
+    def step(self, actions):
+
+        actions = np.asarray(actions)
+        if not np.isin(actions, (0, 1)).all():
+            raise ValueError(f"Got unexpected action - {actions[~np.isin(actions, (0, 1))][0]}")
+
+        reward = np.full(self.num_envs, -0.02)
+        collision_reward = np.array([0., -2., -5., -5.])
+
+        jump_velocity, gravity = self.jump_velocity, self.GRAVITY
+        if self.physics == 'fixed':
+            jump_velocity, gravity = self.jump_fixed, self.gravity_fixed
+
+        for frame in range(1 + self.step_size):
+            if frame == 0:
+                self.bird_velocity[actions == 1] = jump_velocity
+
+            self.bird_velocity += gravity
+            self.move_birds()
+            if self.frame_order == 'neat':
+                # Collisions are against the pipes the bird saw, then the next frame starts
+                is_collided, place_of_collision = self.check_collision()
+                passed = self.move_pipes()
+                self.add_pipes()
+            else:
+                passed = self.move_pipes()
+                self.add_pipes()
+                is_collided, place_of_collision = self.check_collision()
+
+            reward = np.where(is_collided, collision_reward[place_of_collision], np.where(passed, 10., reward))
+
+        done = is_collided
+        if done.any():
+            # With the NEAT order, pipes passed after the collision belong to no episode
+            self.last_pipes_passed[done] = self.pipes_passed[done] - (passed[done] if self.frame_order == 'neat' else 0)
+            self.last_collision[done] = place_of_collision[done]
+            self.reset_worlds(done)
+
+        return self.get_observation(), reward, done